@@ -5,11 +5,17 @@ from __future__ import unicode_literals, print_function
 
 import sys
 import argparse
+import time
 from urllib import urlencode
-from workflow import (Workflow, PasswordNotFound)
-from workflow.background import run_in_background, is_running
+from workflow import Workflow3
+from workflow.background import (run_in_background, is_running, job_health,
+                                 job_status)
 from workflow.notify import notify
 
+import generations
+import queryserver
+from projects import MAX_RESULTS, load_index, trim_results
+
 # Update data
 UPDATE_SETTINGS = {'github_slug': 'jceelen/alfred-10000ft-scripts'}
 ICON_UPDATE = 'icons/update_available.png'
@@ -17,69 +23,123 @@ ICON_UPDATE = 'icons/update_available.png'
 # Shown in error logs. Users can find help here
 HELP_URL = 'https://github.com/jceelen/alfred-10000ft-scripts/issues'
 
+# Answer searches from the resident query server when it's running
+USE_QUERY_SERVER = True
+
+# Seconds an `update.py` run may take before it's killed, so a hung sync
+# can't stop the data from ever being refreshed again. Must be longer
+# than `update.REQUEST_DEADLINE`
+UPDATE_TIMEOUT = 300
+
+# Seconds to wait for a connection to the 10.000ft API and for a response
+CONNECT_TIMEOUT = 10
+REQUEST_TIMEOUT = 60
+
 log = None
 anonymize = False
 
+# In-process project index, only built if the query server is unavailable
+_index = None
+
+
+def get_index():
+    """Return the project index built from the cached data."""
+    global _index
+    if _index is None:
+        _index = load_index(wf)
+    return _index
+
+
+def ask_query_server(message):
+    """Return the query server's answer or `None` if it's unavailable."""
+    if not USE_QUERY_SERVER:
+        return None
+    return queryserver.request(wf, message)
 
-def search_key_for_project(project):
-    """Generate a string search key for a post."""
-    elements = []
-    elements.append(project['name'])
-    elements.append(project['client'])
-    elements.append(project['project_state'])
-    elements.append(str(project['project_code']))
-    return u' '.join(elements)
+
+def search_projects(query, user_tag=None):
+    """Return ``(project, taglist)`` pairs matching the query."""
+    response = ask_query_server({'cmd': 'search',
+                                 'query': query,
+                                 'user_tag': user_tag})
+    if response is not None:
+        return response['results']
+
+    return trim_results(get_index().search(wf, query, user_tag, MAX_RESULTS))
 
 
 def get_project_data(project_id):
     """Find the project matching the project_id."""
-    projects = wf.cached_data('projects', None, max_age=0)
+    response = ask_query_server({'cmd': 'project',
+                                 'project_id': project_id})
+    if response is not None:
+        return response['project']
 
-    # Loop through projects and return project with a match
-    for project in projects:
-        if int(project['id']) == int(project_id):
-            return project
+    return get_index().project(project_id)
 
 
 def get_client_data(client_name):
     """Find the client matching the client_name."""
     log.debug('starting get_client_data')
-    clients = wf.cached_data('clients', None, max_age=0)
+    response = ask_query_server({'cmd': 'client',
+                                 'client_name': client_name})
+    if response is not None:
+        client = response['client']
+    else:
+        client = get_index().client(client_name)
 
-    # Loop through clients and return client with a match
-    for client in clients:
-        if client['name'] == client_name:
-            log.debug('get_client_id finished, client_data: ' + str(client))
-            return client
+    log.debug('get_client_id finished, client_data: %s', client)
+    return client
 
 
 def add_project(project, taglist):
     """Add project as an item to show in Alfred."""
     if anonymize:
-        import random
-        project['name'] = 'Anonimized Project ' + str(project['id'])[-3:]
-        project['client'] = 'Anonimized Client'
-
-    wf.add_item(title=project['name'],
-                subtitle='Client: ' +
-                project['client'] +
-                ' Hit ENTER to show menu, press ALT for more info.',
-                modifier_subtitles={
-                'alt': 'Tags: ' + ', '.join(taglist),
-    },
-        arg=str(project['id']),
-        valid=True,
-        icon='icons/project_{0}.png'.format(
-                    project['project_state']).lower(),
-        copytext=project['name'])
-
-
-def build_taglist(tags):
-    """Generate a list of tags."""
-    taglist = []
-    for tag in tags:
-        taglist.append(tag['value'].lower())
-    return taglist
+        # Copy the project, so the data it came from isn't changed
+        project = dict(project,
+                       name='Anonimized Project ' + str(project['id'])[-3:],
+                       client='Anonimized Client')
+
+    item = wf.add_item(title=project['name'],
+                       subtitle='Client: ' +
+                       project['client'] +
+                       ' Hit ENTER to show menu, press ALT for more info.',
+                       arg=str(project['id']),
+                       valid=True,
+                       icon='icons/project_{0}.png'.format(
+                           project['project_state']).lower(),
+                       copytext=project['name'])
+    item.add_modifier('alt', subtitle='Tags: ' + ', '.join(taglist))
+
+
+def describe_progress(status):
+    """Generate a subtitle from the progress reported by `update.py`."""
+    if status is None:
+        return ''
+
+    if status.get('phase') == 'publishing':
+        return 'Saving {0} record(s)'.format(status.get('records', 0))
+
+    received = status.get('received', 0) / 1024.0
+    unit = 'KB'
+    if received >= 1024:
+        received /= 1024.0
+        unit = 'MB'
+
+    return 'Fetching {0}: {1} record(s), {2:.1f} {3} received'.format(
+        status.get('phase'), status.get('records', 0), received, unit)
+
+
+def describe_backoff(health):
+    """Generate a subtitle from the `job_health` of the update job."""
+    wait = max(int(health['retry_after'] - time.time()), 0)
+    if wait >= 60:
+        wait = '{0} min'.format(wait // 60)
+    else:
+        wait = '{0} sec'.format(wait)
+
+    return ('{0} failed attempt(s), retrying in {1}. '
+            'Use .10kupdate to retry now').format(health['failures'], wait)
 
 
 def build_report_url(view, project):
@@ -108,27 +168,34 @@ def update_data(update_method):
         cmd.append('force')
 
     # Update projects data
-    log.debug('Run update command : {}'.format(cmd))
-    run_in_background('update', cmd)
+    log.debug('Run update command : %s', cmd)
+    run_in_background('update', cmd, timeout=UPDATE_TIMEOUT)
 
     return 0
 
 
+def use_store(name):
+    """Return a magic argument that switches to store ``name``."""
+    def wrapper():
+        wf.settings['store'] = name
+        update_data('refresh')
+        return 'Projects will be read from the {0} store'.format(name)
+
+    return wrapper
+
+
 def update_project(project_id, action):
     """Update specific project in 10.000ft."""
     log.info('Started updating project')
 
     import json
-    from lib import pycurl
-    from StringIO import StringIO
+    from transport import get_transport
 
-    buffer = StringIO()
     project_deleted = None
 
     # Set access variables
     api_key = wf.get_password('10k_api_key')
-    url = 'https://api.10000ft.com/api/v1/projects/' + \
-        str(project_id) + '?auth=' + str(api_key)
+    url = 'https://api.10000ft.com/api/v1/projects/' + str(project_id)
 
     # Determine other variables based on the action
     if action == 'archive_project':
@@ -141,18 +208,18 @@ def update_project(project_id, action):
         status = 'Deleted: '
 
     # Do the request
-    c = pycurl.Curl()
-    c.setopt(c.URL, url)
-    c.setopt(pycurl.HTTPHEADER, ['Content-Type: application/json'])
-    c.setopt(pycurl.CUSTOMREQUEST, request_method)
-    c.setopt(pycurl.POSTFIELDS, data)
-    c.setopt(c.WRITEDATA, buffer)
-    c.perform()
-    c.close()
+    transport = get_transport(wf, connect_timeout=CONNECT_TIMEOUT,
+                              timeout=REQUEST_TIMEOUT)
+    try:
+        response = transport.request(
+            request_method, url, {'auth': api_key}, data,
+            {'Content-Type': 'application/json'})
+    finally:
+        transport.close()
 
     # Capture the response and store the json in a dictionary
-    result = buffer.getvalue()
-    log.info('Request is finished. Result from 10.000ft: ' + str(result))
+    result = response.body
+    log.info('Request is finished. Result from 10.000ft: %s', result)
 
     project = ''
 
@@ -167,8 +234,8 @@ def update_project(project_id, action):
     # Finishing up based on response from 10.000ft
     if project_deleted is True:
         # The project is deleted!
-        log.info('The project with id ' + project_id +
-                 ' is succesfully deleted from 10.000ft')
+        log.info('The project with id %s is succesfully deleted from '
+                 '10.000ft', project_id)
         notify_title = 'Your project is deleted!'
         notify_text = 'The project is succesfully deleted from 10.000ft'
 
@@ -177,7 +244,7 @@ def update_project(project_id, action):
     elif 'id' in project:
         # If we get an object with a project ID this means that the project
         # update of data was succesfull
-        log.debug('Processed result to project: ' + str(project))
+        log.debug('Processed result to project: %s', project)
         # If everything goes well 10.000ft returns all the updated project info
         notify_title = 'Your project is updated!'
         notify_text = status + project['name']
@@ -191,7 +258,7 @@ def update_project(project_id, action):
         notify_text = project['message']
         log.info(
             'Something went wrong :-/.'
-            ' Message from 10.000ft: ' + str(project['message']))
+            ' Message from 10.000ft: %s', project['message'])
 
     else:
         notify_title = 'An error occured :-/)'
@@ -271,7 +338,7 @@ def main(wf):
     if args.user:  # Script was passed a username
         # save the user
         wf.settings['user'] = args.user.lower()
-        log.debug('WF settings: ' + str(wf.settings))
+        log.debug('WF settings: %s', wf.settings)
 
         # Notify the user
         notify_title = 'Saved User-tag-name'
@@ -306,10 +373,9 @@ def main(wf):
     # Get data and filter 10.000ft projects
     ####################################################################
 
-    # Is the API key stored in the Keychain?
-    try:
-        wf.get_password('10k_api_key')
-    except PasswordNotFound:  # API key has not yet been set
+    # Is the API key stored in the Keychain? Only the sync and the project
+    # updates need the key itself, so don't ask the Keychain for it here
+    if not wf.has_password('10k_api_key'):  # API key has not yet been set
         wf.add_item('No API key set.',
                     'Please use .10ksetkey to set your 10.000ft API key.',
                     valid=False,
@@ -320,32 +386,60 @@ def main(wf):
     # Get query from Alfred
     query = args.query
 
-    # Get posts from cache. Set `data_func` to None, as we don't want to
-    # update the cache in this script and `max_age` to 0 because we want
-    # the cached data regardless of age
-    projects = wf.cached_data('projects', None, max_age=0)
-    clients = wf.cached_data('clients', None, max_age=0)
-
-    # Start update script if cached data is too old (or doesn't exist)
-    if not wf.cached_data_fresh('projects', max_age=600):
-        update_data('refresh')
-
-    if not wf.cached_data_fresh('clients', max_age=600):
-        update_data('refresh')
-
-    # Notify the user if the cache is being updated
+    # Start update script if cached data is too old (or doesn't exist),
+    # unless the last syncs failed and it should back off for a while.
+    # `.10kupdate` still syncs right away
+    data_age = generations.age(wf)
+    if not data_age or data_age >= 600:
+        health = job_health('update')
+        if health['state'] == 'open':
+            log.debug('Not updating: %d failed sync(s), retrying in %ds',
+                      health['failures'],
+                      health['retry_after'] - time.time())
+            wf.add_item('Syncing with 10.000ft failed',
+                        describe_backoff(health),
+                        valid=False,
+                        icon='icons/warning.png')
+        else:
+            update_data('refresh')
+
+    # Notify the user if the cache is being updated and show the list
+    # again every second until it's done
     if is_running('update'):
         wf.add_item('Fetching data from 10.000ft...',
+                    describe_progress(job_status('update')),
                     valid=False,
                     icon='icons/fetching_data.png')
+        wf.rerun = 1
 
-    # If script was passed a query, use it to filter projects
-    if query and projects:
-        projects = wf.filter(
-            query, projects, key=search_key_for_project, min_score=20)
+    if wf.args[0] == '--options':
+        # Get current project data
+        project = get_project_data(args.project_id)
+        results = [project] if project else []
+
+    else:
+        user_tag = None
+        if wf.args[0] == '--user':
+            # Only show projects of current user if the argument --user is
+            # passed on
+            if 'user' not in wf.settings:
+                # Show an error if the 'user' key is not in wf.settings
+                wf.add_item('No User-tag-name saved.',
+                            ('Please use .10ksetuser to set '
+                             'your 10.000ft User-tag-name.'),
+                            valid=False,
+                            icon='icons/warning.png')
+                wf.send_feedback()
+                return 0
+
+            # Get the user tag from wf.settings
+            user_tag = wf.settings['user']
+
+        # If script was passed a query, use it to filter projects
+        results = search_projects(query, user_tag)
 
     # If we have no data to show, so show a warning and stop
-    if not projects:
+    if not results:
         wf.add_item('No projects found', icon='icons/warning.png')
         wf.send_feedback()
         return 0
@@ -358,9 +452,7 @@ def main(wf):
     # project.
     if wf.args[0] == '--options':
 
-        # Get current project data
         log.info('Started building options menu')
-        project = get_project_data(args.project_id)
 
         # Build report URLs
         report_time = build_report_url(25, project)
@@ -409,41 +501,20 @@ def main(wf):
     else:
         # Loop through the returned projects and add an item for each to the
         # list of results for Alfred
-        for project in projects:
-            # Extract tags from data and put them in a list
-            taglist = build_taglist(project['tags']['data'])
-
-            if wf.args[0] == '--user':
-                # Only show projects of current user if the argument --user is
-                # passed on
-                if 'user' in wf.settings:
-                    # Get the user tag from wf.settings
-                    user_tag = wf.settings['user']
-                    # Check if the current user_tag is in the list of tags for
-                    # this project.
-                    if user_tag in taglist:
-                        # Add the project to the list as an item
-                        add_project(project, taglist)
-                else:
-                    # Show an error if the 'user' key is not in wf.settings
-                    wf.add_item('No User-tag-name saved.',
-                                ('Please use .10ksetuser to set '
-                                 'your 10.000ft User-tag-name.'),
-                                valid=False,
-                                icon='icons/warning.png')
-                    wf.send_feedback()
-                    return 0
-            else:
-                # In all other situations, just show the list of all the
-                # projects
-                add_project(project, taglist)
+        for project, taglist in results:
+            add_project(project, taglist)
         # Send the results to Alfred as XML
         wf.send_feedback()
         return 0
 
 
 if __name__ == '__main__':
-    wf = Workflow(help_url=HELP_URL,
-                  update_settings=UPDATE_SETTINGS)
+    wf = Workflow3(help_url=HELP_URL,
+                   update_settings=UPDATE_SETTINGS)
     log = wf.logger
-    sys.exit(wf.run(main))
+    wf.magic_arguments['storetable'] = use_store('table')
+    wf.magic_arguments['storesqlite'] = use_store('sqlite')
+    retcode = wf.run(main)
+    if _index is not None:
+        _index.close()
+    sys.exit(retcode)
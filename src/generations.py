@@ -0,0 +1,175 @@
+# encoding: utf-8
+"""Consistent snapshots of the synced 10.000ft data.
+
+A sync writes everything it produces (the projects, the clients and the
+store built from them) into a new generation directory and then
+publishes it by atomically replacing a pointer file with the
+generation's name and the time it was published. Readers resolve the
+pointer once and only read from that generation, so they always see
+projects and clients from the same sync and never need a lock. Old
+generations are deleted by the next sync, after they've had time to
+finish being read.
+"""
+
+from __future__ import unicode_literals
+
+import os
+import shutil
+import tempfile
+import time
+
+from workflow import manager
+from workflow.cachemanager import always_keep
+from workflow.util import atomic_writer
+
+# Directory in the cache directory the generations are saved in
+GENERATIONS_DIRNAME = 'generations'
+
+# File in the cache directory with the name of the current generation
+# and the time it was published
+POINTER_FILENAME = 'generation'
+
+# Number of superseded generations to keep for readers that resolved
+# the pointer before it was flipped
+KEEP_PREVIOUS = 1
+
+# Whichever job sweeps the cache directory mustn't delete the pointer
+always_keep(POINTER_FILENAME)
+
+
+class Generation(object):
+    """A generation directory.
+
+    Files are saved with the workflow's cache serializer. ``published``
+    is the time the generation was published or `None` if it hasn't
+    been.
+    """
+
+    def __init__(self, wf, path, published=None):
+        self.wf = wf
+        self.path = path
+        self.published = published
+
+    @property
+    def name(self):
+        """Name of the generation directory."""
+        return os.path.basename(self.path)
+
+    @property
+    def age(self):
+        """Seconds since the generation was published.
+
+        The directory's mtime can't be used: SQLite creates and deletes
+        its `-wal` and `-shm` files in it whenever the store is read.
+        Unpublished generations are as old as their directory.
+        """
+        if self.published is None:
+            return time.time() - os.stat(self.path).st_mtime
+        return time.time() - self.published
+
+    def file(self, filename):
+        """Return path to ``filename`` in the generation."""
+        return os.path.join(self.path, filename)
+
+    def load(self, name):
+        """Return the data saved under ``name`` or `None`."""
+        path = self.file('%s.%s' % (name, self.wf.cache_serializer))
+        if not os.path.exists(path):
+            return None
+
+        with open(path, 'rb') as fp:
+            return manager.serializer(self.wf.cache_serializer).load(fp)
+
+    def dump(self, name, data):
+        """Save ``data`` under ``name``."""
+        path = self.file('%s.%s' % (name, self.wf.cache_serializer))
+        with atomic_writer(path, 'wb') as fp:
+            manager.serializer(self.wf.cache_serializer).dump(data, fp)
+
+
+def _generations_dir(wf):
+    return wf.cachefile(GENERATIONS_DIRNAME)
+
+
+def _read_pointer(wf):
+    """Return name and publication time of the current generation.
+
+    Returns ``(None, None)`` if no generation has been published.
+    """
+    try:
+        with open(wf.cachefile(POINTER_FILENAME), 'rb') as fp:
+            name, published = fp.read().decode('utf-8').splitlines()
+    except IOError:
+        return None, None
+
+    return name, float(published)
+
+
+def current_name(wf):
+    """Return the name of the published generation or `None`."""
+    return _read_pointer(wf)[0]
+
+
+def current(wf):
+    """Return the published :class:`Generation` or `None`."""
+    name, published = _read_pointer(wf)
+    if name is None:
+        return None
+
+    path = os.path.join(_generations_dir(wf), name)
+    if not os.path.isdir(path):
+        wf.logger.warning('published generation %s does not exist', name)
+        return None
+
+    return Generation(wf, path, published)
+
+
+def age(wf):
+    """Return age in seconds of the published data or 0 if there is none."""
+    generation = current(wf)
+    if generation is None:
+        return 0
+    return generation.age
+
+
+def create(wf):
+    """Return a new, unpublished :class:`Generation`.
+
+    Names start with the creation time in milliseconds, so they sort
+    in the order the generations were created.
+    """
+    dirpath = _generations_dir(wf)
+    if not os.path.exists(dirpath):
+        os.makedirs(dirpath)
+
+    prefix = '{0:013d}-'.format(int(time.time() * 1000))
+    return Generation(wf, tempfile.mkdtemp(prefix=prefix, dir=dirpath))
+
+
+def publish(wf, generation):
+    """Make ``generation`` the current generation."""
+    published = time.time()
+    with atomic_writer(wf.cachefile(POINTER_FILENAME), 'wb') as fp:
+        fp.write('{0}\n{1!r}\n'.format(generation.name,
+                                        published).encode('utf-8'))
+
+    generation.published = published
+
+    wf.logger.debug('published generation %s', generation.name)
+
+
+def collect_garbage(wf):
+    """Delete generations that can no longer be read.
+
+    Keeps the current generation, the `KEEP_PREVIOUS` generations before
+    it and any newer ones, which are still being written.
+    """
+    dirpath = _generations_dir(wf)
+    name = current_name(wf)
+    if name is None or not os.path.exists(dirpath):
+        return
+
+    older = sorted(n for n in os.listdir(dirpath) if n < name)
+    for old in older[:len(older) - KEEP_PREVIOUS]:
+        shutil.rmtree(os.path.join(dirpath, old), ignore_errors=True)
+        wf.logger.debug('deleted generation %s', old)
@@ -0,0 +1,160 @@
+# encoding: utf-8
+"""SQLite storage for the synced 10.000ft data.
+
+An alternative to the pickled caches and the project table: projects,
+their tags and the clients are stored in tables, with a full-text
+index over the projects' search keys. `update.py` rewrites everything
+in one transaction per sync. The database uses WAL mode, so readers
+never wait for the background writer.
+"""
+
+from __future__ import unicode_literals
+
+import json
+import sqlite3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    position INTEGER NOT NULL,
+    search_key TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tags (
+    project_id INTEGER NOT NULL,
+    value TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tags_value ON tags (value, project_id);
+CREATE TABLE IF NOT EXISTS clients (
+    name TEXT NOT NULL,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS clients_name ON clients (name);
+CREATE VIRTUAL TABLE IF NOT EXISTS projects_fts USING fts4(search_key);
+"""
+
+# Seconds to wait for a lock held by another connection
+TIMEOUT = 5
+
+
+def fts_query(query):
+    """Turn ``query`` into an FTS query matching words with its prefixes.
+
+    Returns `None` if ``query`` has no usable words.
+    """
+    words = []
+    for word in query.split():
+        word = word.replace('"', '')
+        if word:
+            words.append('"{0}*"'.format(word))
+
+    return ' '.join(words) or None
+
+
+class ProjectDB(object):
+    """Projects, tags and clients in an SQLite database at ``path``."""
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=TIMEOUT)
+
+    def close(self):
+        """Close the database connection."""
+        self._conn.close()
+
+    def get_meta(self, key):
+        """Return the value of ``key`` in the `meta` table or `None`."""
+        try:
+            row = self._conn.execute('SELECT value FROM meta WHERE key = ?',
+                                     (key,)).fetchone()
+        except sqlite3.OperationalError:  # no schema yet
+            return None
+
+        return row[0] if row else None
+
+    def write(self, projects, clients, search_key, meta=None):
+        """Replace all data with ``projects`` and ``clients``.
+
+        ``search_key`` is called with each project to generate the text
+        that is indexed for full-text search. ``meta`` is a mapping of
+        values to save in the `meta` table.
+        """
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.executescript(SCHEMA)
+
+        with self._conn:  # one transaction
+            for table in ('projects', 'projects_fts', 'tags', 'clients'):
+                self._conn.execute('DELETE FROM {0}'.format(table))
+
+            for position, project in enumerate(projects):
+                key = search_key(project)
+                cursor = self._conn.execute(
+                    'INSERT OR IGNORE INTO projects VALUES (?, ?, ?, ?)',
+                    (int(project['id']), position, key, json.dumps(project)))
+                if not cursor.rowcount:  # duplicate id
+                    continue
+
+                self._conn.execute(
+                    'INSERT INTO projects_fts (docid, search_key) '
+                    'VALUES (?, ?)', (int(project['id']), key))
+                self._conn.executemany(
+                    'INSERT INTO tags VALUES (?, ?)',
+                    [(int(project['id']), tag['value'].lower())
+                     for tag in project['tags']['data']])
+
+            self._conn.executemany(
+                'INSERT INTO clients VALUES (?, ?)',
+                [(client['name'], json.dumps(client)) for client in clients])
+
+            for key, value in (meta or {}).items():
+                self._conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)',
+                                   (key, value))
+
+    def count(self):
+        """Return the number of projects."""
+        return self._conn.execute('SELECT COUNT(*) FROM projects').fetchone()[0]
+
+    def search(self, query=None, user_tag=None):
+        """Return ``(search_key, data)`` rows of the matching projects.
+
+        Projects match ``query`` if they contain words starting with all
+        of its words, and ``user_tag`` if they have that (lowercase) tag.
+        Rows are in the order the projects were saved in and ``data`` is
+        the project as JSON.
+        """
+        sql = 'SELECT search_key, data FROM projects p'
+        conditions = []
+        params = []
+
+        if query and fts_query(query):
+            conditions.append('p.id IN (SELECT docid FROM projects_fts '
+                              'WHERE projects_fts MATCH ?)')
+            params.append(fts_query(query))
+
+        if user_tag is not None:
+            conditions.append('EXISTS (SELECT 1 FROM tags t WHERE '
+                              't.value = ? AND t.project_id = p.id)')
+            params.append(user_tag)
+
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+
+        sql += ' ORDER BY p.position'
+        return self._conn.execute(sql, params).fetchall()
+
+    def project(self, project_id):
+        """Return the project with ``project_id`` or `None`."""
+        row = self._conn.execute('SELECT data FROM projects WHERE id = ?',
+                                 (int(project_id),)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def client(self, client_name):
+        """Return the first client named ``client_name`` or `None`."""
+        row = self._conn.execute(
+            'SELECT data FROM clients WHERE name = ? ORDER BY rowid LIMIT 1',
+            (client_name,)).fetchone()
+        return json.loads(row[0]) if row else None
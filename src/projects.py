@@ -0,0 +1,299 @@
+# encoding: utf-8
+"""Search helpers for the cached 10.000ft data.
+
+Shared by the Script Filter (`10000ft.py`) and the resident query
+server (`queryserver.py`), so both filter projects in exactly the
+same way.
+"""
+
+from __future__ import unicode_literals
+
+import json
+import os
+from operator import itemgetter
+
+import generations
+import projectdb
+import projecttable
+
+# Names of the data saved in each generation by `update.py`
+CACHE_NAMES = ('projects', 'clients')
+
+# Generation file with the projects as a `projecttable`
+TABLE_FILENAME = 'projects.table'
+
+# Generation file with the `projectdb` database
+DB_FILENAME = 'projects.sqlite'
+
+# Stores the Script Filter can read the synced data from, besides the
+# pickled data. Set with the `store` setting
+STORES = ('table', 'sqlite')
+DEFAULT_STORE = 'table'
+
+# The project fields a search result is shown with
+RESULT_FIELDS = ('id', 'name', 'client', 'project_state')
+
+# Maximum number of search results shown in Alfred
+MAX_RESULTS = 50
+
+
+def search_key_for_project(project):
+    """Generate a string search key for a post."""
+    elements = []
+    elements.append(project['name'])
+    elements.append(project['client'])
+    elements.append(project['project_state'])
+    elements.append(str(project['project_code']))
+    return u' '.join(elements)
+
+
+def build_taglist(tags):
+    """Generate a list of tags."""
+    taglist = []
+    for tag in tags:
+        taglist.append(tag['value'].lower())
+    return taglist
+
+
+def trim_results(results):
+    """Return search ``results`` with only the fields that are shown.
+
+    Projects only keep the fields in `RESULT_FIELDS`, so the query
+    server doesn't have to encode (and the Script Filter decode) their
+    budget items and other data the list doesn't show.
+    """
+    return [(dict((k, project[k]) for k in RESULT_FIELDS), taglist)
+            for project, taglist in results]
+
+
+def store_name(wf):
+    """Return the name of the configured store (see `STORES`)."""
+    name = wf.settings.get('store', DEFAULT_STORE)
+    if name not in STORES:
+        return DEFAULT_STORE
+    return name
+
+
+def _store_filename(wf):
+    if store_name(wf) == 'sqlite':
+        return DB_FILENAME
+    return TABLE_FILENAME
+
+
+def has_store(wf, generation):
+    """Whether ``generation`` contains the configured store."""
+    return os.path.exists(generation.file(_store_filename(wf)))
+
+
+def cache_signature(wf):
+    """Return a value that changes whenever new data is published.
+
+    Can be used to decide whether a loaded index is still current.
+    """
+    return (generations.current_name(wf), store_name(wf))
+
+
+def write_generation(wf, generation, projects, clients):
+    """Save ``projects``, ``clients`` and the configured store."""
+    generation.dump('projects', projects)
+    generation.dump('clients', clients)
+
+    if store_name(wf) == 'sqlite':
+        db = projectdb.ProjectDB(generation.file(DB_FILENAME))
+        try:
+            db.write(projects, clients, search_key_for_project,
+                     {'generation': generation.name})
+        finally:
+            db.close()
+    else:
+        projecttable.write(generation.file(TABLE_FILENAME), projects,
+                           search_key_for_project)
+
+    wf.logger.debug('%d projects written to %s store of generation %s',
+                    len(projects), store_name(wf), generation.name)
+
+
+def delete_legacy_caches(wf):
+    """Delete caches from before the data was saved in generations."""
+    for name in CACHE_NAMES:
+        wf.cache_data(name, None)
+
+    for filename in (TABLE_FILENAME, DB_FILENAME, DB_FILENAME + '-wal',
+                     DB_FILENAME + '-shm'):
+        if os.path.exists(wf.cachefile(filename)):
+            os.unlink(wf.cachefile(filename))
+
+
+class ProjectIndex(object):
+    """In-memory index over projects and clients.
+
+    Search keys and tag lists are computed once when the index is
+    built, so repeated searches only have to score the keys.
+    """
+
+    def __init__(self, projects, clients):
+        # (search key, project, taglist) for every project
+        self._entries = []
+        self._by_id = {}
+        for project in projects or []:
+            self._add(project['id'], search_key_for_project(project),
+                      project, build_taglist(project['tags']['data']))
+
+        self._clients = {}
+        for client in clients or []:
+            self._clients.setdefault(client['name'], client)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _add(self, project_id, key, ref, taglist):
+        """Add a project to the index.
+
+        ``ref`` is whatever `_load` turns into the project dict.
+        """
+        self._entries.append((key, ref, taglist))
+        self._by_id.setdefault(int(project_id), ref)
+
+    def _load(self, ref):
+        """Return the project dict for ``ref``."""
+        return ref
+
+    def search(self, wf, query=None, user_tag=None, limit=None):
+        """Return ``(project, taglist)`` pairs matching ``query``.
+
+        If ``user_tag`` is set, only projects tagged with it are returned.
+        At most ``limit`` pairs are returned if it's set.
+        """
+        entries = self._entries
+
+        if query and entries:
+            entries = wf.filter(query, entries, key=itemgetter(0),
+                                min_score=20)
+
+        if user_tag is not None:
+            entries = [e for e in entries if user_tag in e[2]]
+
+        return [(self._load(ref), taglist)
+                for _, ref, taglist in entries[:limit]]
+
+    def project(self, project_id):
+        """Find the project matching the project_id."""
+        ref = self._by_id.get(int(project_id))
+        if ref is None:
+            return None
+        return self._load(ref)
+
+    def client(self, client_name):
+        """Find the client matching the client_name."""
+        return self._clients.get(client_name)
+
+    def close(self):
+        """Release the resources held by the index."""
+
+
+class TableIndex(ProjectIndex):
+    """:class:`ProjectIndex` over a :class:`~projecttable.ProjectTable`.
+
+    Only the ids, search keys and tags are read up front. The other
+    fields are only read for the projects that are returned.
+    """
+
+    def __init__(self, table, clients):
+        super(TableIndex, self).__init__(None, clients)
+        self.table = table
+
+        for row in xrange(len(table)):
+            record = table.record(row)
+            taglist = [tag.lower() for tag in table.tags(row, record)]
+            self._add(record[0], table.search_key(row, record), row, taglist)
+
+    def _load(self, ref):
+        return self.table[ref]
+
+
+class DBIndex(object):
+    """Answers the same queries as :class:`ProjectIndex` from a database.
+
+    The user tag is matched in SQL and the full-text index narrows the
+    projects down to those with words starting with the query's words.
+    Their search keys are then ranked with `Workflow.filter`, just like
+    :class:`ProjectIndex` does, and only the matching projects are
+    decoded. The full-text index can't find substring and fuzzy matches
+    (e.g. on initials), so if none of its projects match, all projects
+    with the user tag are ranked instead.
+
+    Call :meth:`close` when done, so the database is checkpointed.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def __len__(self):
+        return self.db.count()
+
+    def search(self, wf, query=None, user_tag=None, limit=None):
+        """Return ``(project, taglist)`` pairs matching ``query``.
+
+        If ``user_tag`` is set, only projects tagged with it are returned.
+        At most ``limit`` pairs are returned if it's set.
+        """
+        if query:
+            rows = self._rank(wf, query, self.db.search(query, user_tag))
+            if not rows:  # no word starts with the query
+                rows = self._rank(wf, query, self.db.search(None, user_tag))
+        else:
+            rows = self.db.search(None, user_tag)
+
+        results = []
+        for _, data in rows[:limit]:
+            project = json.loads(data)
+            results.append((project, build_taglist(project['tags']['data'])))
+
+        return results
+
+    def _rank(self, wf, query, rows):
+        """Return ``rows`` matching ``query``, best matches first."""
+        if not rows:
+            return rows
+        return wf.filter(query, rows, key=itemgetter(0), min_score=20)
+
+    def project(self, project_id):
+        """Find the project matching the project_id."""
+        return self.db.project(project_id)
+
+    def client(self, client_name):
+        """Find the client matching the client_name."""
+        return self.db.client(client_name)
+
+    def close(self):
+        """Close the database connection."""
+        self.db.close()
+
+
+def load_index(wf):
+    """Build an index from the published generation.
+
+    Uses the configured store if the generation has it and falls back
+    to the pickled data otherwise. Returns an empty index if no data
+    has been published yet.
+    """
+    generation = generations.current(wf)
+    if generation is None:
+        return ProjectIndex(None, None)
+
+    store = store_name(wf)
+
+    if store == 'sqlite' and has_store(wf, generation):
+        return DBIndex(projectdb.ProjectDB(generation.file(DB_FILENAME)))
+
+    clients = generation.load('clients')
+
+    if store == 'table' and has_store(wf, generation):
+        try:
+            table = projecttable.ProjectTable(generation.file(TABLE_FILENAME))
+        except (EnvironmentError, ValueError) as err:
+            wf.logger.warning("Can't read project table: %s", err)
+        else:
+            return TableIndex(table, clients)
+
+    return ProjectIndex(generation.load('projects'), clients)
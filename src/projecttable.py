@@ -0,0 +1,150 @@
+# encoding: utf-8
+"""Compact, memory-mapped storage for the list of projects.
+
+Unpickling the projects cache builds every project dict on every run.
+A project table stores the fields the workflow uses as fixed-width
+records plus a heap of UTF-8 strings and is read through :mod:`mmap`,
+so only the pages of the records that are actually read are loaded.
+
+File layout (little-endian):
+
+    header   magic, format version and number of records
+    records  per project: its id and an (offset, length) pair into
+             the heap for each column in `COLUMNS`
+    heap     the UTF-8 encoded column values
+"""
+
+from __future__ import unicode_literals
+
+import mmap
+import struct
+
+from workflow.util import atomic_writer
+
+MAGIC = b'10KT'
+VERSION = 1
+
+# String columns, in record order
+COLUMNS = ('name', 'client', 'project_state', 'project_code',
+           'starts_at', 'ends_at', 'tags', 'search_key')
+
+HEADER = struct.Struct(b'<4sHI')
+RECORD = struct.Struct(b'<q' + b'II' * len(COLUMNS))
+
+# Length of a column whose value is None
+NULL = 0xFFFFFFFF
+
+# Separates the tags in the `tags` column
+TAG_SEPARATOR = '\x1f'
+
+
+def write(path, projects, search_key):
+    """Save ``projects`` as a project table at ``path``.
+
+    ``search_key`` is called with each project to generate the value of
+    the `search_key` column.
+    """
+    records = []
+    heap = []
+    heap_size = 0
+
+    for project in projects:
+        values = [project.get(name) for name in COLUMNS[:-2]]
+        values.append(TAG_SEPARATOR.join(
+            tag['value'] for tag in project['tags']['data']))
+        values.append(search_key(project))
+
+        fields = [int(project['id'])]
+        for value in values:
+            if value is None:
+                fields.extend((0, NULL))
+                continue
+
+            data = unicode(value).encode('utf-8')
+            fields.extend((heap_size, len(data)))
+            heap.append(data)
+            heap_size += len(data)
+
+        records.append(RECORD.pack(*fields))
+
+    with atomic_writer(path, 'wb') as fp:
+        fp.write(HEADER.pack(MAGIC, VERSION, len(records)))
+        fp.write(b''.join(records))
+        fp.write(b''.join(heap))
+
+
+class ProjectTable(object):
+    """Read-only view of a project table file.
+
+    Behaves like a list of project dicts. The dicts are built on
+    access and only have the keys in `COLUMNS` (minus `search_key`),
+    plus `id` and the usual `tags` structure.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as fp:
+            self._map = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, self._count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('Not a project table: {0}'.format(path))
+
+        self._heap = HEADER.size + self._count * RECORD.size
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, row):
+        if not 0 <= row < self._count:
+            raise IndexError('Project table row out of range')
+
+        record = self.record(row)
+        project = {'id': record[0]}
+        for i, name in enumerate(COLUMNS[:-2]):
+            project[name] = self._value(record, i)
+
+        project['tags'] = {'data': [{'value': tag}
+                                    for tag in self.tags(row, record)]}
+        return project
+
+    def __iter__(self):
+        for row in xrange(self._count):
+            yield self[row]
+
+    def project_id(self, row):
+        """Return the id of the project in ``row``."""
+        return self.record(row)[0]
+
+    def search_key(self, row, record=None):
+        """Return the search key of the project in ``row``."""
+        record = record or self.record(row)
+        return self._value(record, len(COLUMNS) - 1)
+
+    def tags(self, row, record=None):
+        """Return the list of tags of the project in ``row``."""
+        record = record or self.record(row)
+        tags = self._value(record, len(COLUMNS) - 2)
+        if not tags:
+            return []
+        return tags.split(TAG_SEPARATOR)
+
+    def record(self, row):
+        """Return the raw record for ``row``.
+
+        Pass it to `search_key` and `tags` to read several columns
+        without unpacking the record again.
+        """
+        return RECORD.unpack_from(self._map, HEADER.size + row * RECORD.size)
+
+    def close(self):
+        """Unmap the file."""
+        self._map.close()
+
+    def _value(self, record, column):
+        offset, length = record[1 + column * 2:3 + column * 2]
+        if length == NULL:
+            return None
+
+        start = self._heap + offset
+        return self._map[start:start + length].decode('utf-8')
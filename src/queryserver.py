@@ -0,0 +1,200 @@
+#!/usr/bin/python
+# encoding: utf-8
+"""Resident query server for the 10.000ft Script Filter.
+
+Keeps the project index in memory and answers search requests over a
+Unix domain socket, so a keystroke costs a round trip instead of
+unpickling and indexing the cache. The server is started in the
+background on first use and exits after `IDLE_TIMEOUT` seconds
+without requests.
+"""
+
+from __future__ import unicode_literals
+
+import json
+import os
+import socket
+import tempfile
+
+from workflow import Workflow
+from workflow.background import run_in_background, is_running
+
+from projects import MAX_RESULTS, cache_signature, load_index, trim_results
+
+# Seconds without a request after which the server exits
+IDLE_TIMEOUT = 300
+
+# Seconds the Script Filter waits for an answer before searching itself
+CLIENT_TIMEOUT = 0.5
+
+# Seconds the server waits for a client to send its request
+CONNECTION_TIMEOUT = 5
+
+# Will be populated later
+log = None
+
+
+def socket_path(wf):
+    """Return path of the server's Unix domain socket.
+
+    The socket lives in the (per-user) temporary directory, because the
+    path to the cache directory can exceed the maximum socket path length.
+    """
+    return os.path.join(tempfile.gettempdir(),
+                        '{0}.{1}.sock'.format(wf.bundleid, os.getuid()))
+
+
+def start(wf):
+    """Start the query server in the background if it isn't running."""
+    if is_running('queryserver'):
+        return
+
+    cmd = ['/usr/bin/python', wf.workflowfile('queryserver.py')]
+    run_in_background('queryserver', cmd)
+
+
+def request(wf, message):
+    """Send ``message`` to the query server and return its answer.
+
+    Returns `None` if the server is not available. The server is then
+    started for the next keystroke and the caller should search
+    in-process instead.
+    """
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client.settimeout(CLIENT_TIMEOUT)
+
+    data = []
+    try:
+        client.connect(socket_path(wf))
+        client.sendall(json.dumps(message) + b'\n')
+        client.shutdown(socket.SHUT_WR)
+
+        while True:
+            chunk = client.recv(65536)
+            if not chunk:
+                break
+            data.append(chunk)
+
+    except socket.error as err:  # also catches socket.timeout
+        wf.logger.debug('query server not available: %s', err)
+        # Close the socket first, so the server doesn't inherit it
+        client.close()
+        start(wf)
+        return None
+
+    finally:
+        client.close()
+
+    try:
+        response = json.loads(b''.join(data))
+    except ValueError:
+        # Empty or truncated answer, e.g. the server failed to answer
+        wf.logger.error('invalid answer from query server: %r',
+                        b''.join(data)[:100])
+        return None
+
+    if 'error' in response:
+        wf.logger.error('query server error: %s', response['error'])
+        return None
+
+    return response
+
+
+class QueryServer(object):
+    """Answers search requests from an in-memory :class:`ProjectIndex`.
+
+    The index is rebuilt whenever `update.py` rewrites the caches.
+    """
+
+    def __init__(self, wf):
+        self.wf = wf
+        self._index = None
+        self._signature = None
+
+    @property
+    def index(self):
+        """The current project index."""
+        signature = cache_signature(self.wf)
+        if self._index is None or signature != self._signature:
+            if self._index is not None:
+                self._index.close()
+            self._index = load_index(self.wf)
+            self._signature = signature
+            log.info('Indexed %d projects', len(self._index))
+
+        return self._index
+
+    def handle(self, message):
+        """Return the answer to a single request."""
+        cmd = message.get('cmd')
+
+        if cmd == 'search':
+            results = self.index.search(self.wf, message.get('query'),
+                                        message.get('user_tag'), MAX_RESULTS)
+            return {'results': trim_results(results)}
+
+        if cmd == 'project':
+            return {'project': self.index.project(message['project_id'])}
+
+        if cmd == 'client':
+            return {'client': self.index.client(message['client_name'])}
+
+        raise ValueError('Unknown command: {0!r}'.format(cmd))
+
+    def serve(self, path):
+        """Answer requests on socket ``path`` until idle for too long."""
+        if os.path.exists(path):
+            # Left behind by a server that didn't exit cleanly
+            os.unlink(path)
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(path)
+        os.chmod(path, 0o600)
+        server.listen(5)
+        server.settimeout(IDLE_TIMEOUT)
+        log.info('Query server listening on %s', path)
+
+        try:
+            while True:
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    log.info('Query server idle for %d seconds, exiting',
+                             IDLE_TIMEOUT)
+                    break
+
+                try:
+                    self._answer(conn)
+                except Exception:
+                    log.exception('Could not answer request')
+                finally:
+                    conn.close()
+        finally:
+            server.close()
+            if os.path.exists(path):
+                os.unlink(path)
+            if self._index is not None:
+                self._index.close()
+
+    def _answer(self, conn):
+        """Read one request from ``conn`` and send the answer."""
+        conn.settimeout(CONNECTION_TIMEOUT)
+        message = json.loads(conn.makefile('rb').readline())
+
+        try:
+            response = self.handle(message)
+        except Exception as err:
+            log.exception('Request failed: %r', message)
+            response = {'error': unicode(err)}
+
+        conn.sendall(json.dumps(response))
+
+
+def main(wf):
+    QueryServer(wf).serve(socket_path(wf))
+
+
+if __name__ == '__main__':
+    wf = Workflow()
+    log = wf.logger
+    wf.run(main)
@@ -0,0 +1,362 @@
+# encoding: utf-8
+"""One interface for the HTTP requests to the 10.000ft API.
+
+A :class:`Transport` makes requests with one of two backends: pycurl
+(`CurlTransport`) or `workflow.web` (`UrllibTransport`). Both keep
+connections open between requests, accept gzipped responses, enforce
+a connection and a total timeout, retry failed requests and measure how
+long each request took, so the sync and the project actions behave the
+same whichever backend is used. Set the backend with the `transport`
+setting.
+"""
+
+from __future__ import unicode_literals
+
+import abc
+import httplib
+import json
+import time
+from cStringIO import StringIO
+from urllib import urlencode
+
+from workflow import web
+
+# Backends a `Transport` can use. Set with the `transport` setting
+BACKENDS = ('pycurl', 'urllib2')
+DEFAULT_BACKEND = 'pycurl'
+
+# Seconds to wait for a connection and for a whole response
+CONNECT_TIMEOUT = 10
+TIMEOUT = 120
+
+# Number of times a failed request is retried and the seconds to wait
+# before the first retry. The wait doubles with every retry
+RETRIES = 2
+RETRY_DELAY = 1
+
+# Only requests that can safely be sent twice are retried
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE')
+
+# Response statuses that are worth retrying a request for
+RETRY_STATUSES = (502, 503, 504)
+
+# Bytes read at a time by `UrllibTransport`
+CHUNK_SIZE = 65536
+
+
+class TransportError(Exception):
+    """A request failed without a response."""
+
+
+class HTTPError(TransportError):
+    """The server returned an error status."""
+
+    def __init__(self, response):
+        # Without the query, which contains the API key
+        super(HTTPError, self).__init__('{0} returned HTTP {1}'.format(
+            response.url.split('?')[0], response.status))
+        self.response = response
+
+
+class Response(object):
+    """Response to a :class:`Transport` request.
+
+    ``body`` is decompressed. ``size`` is the number of bytes that were
+    received for it and ``timing`` maps ``connect``, ``ttfb`` (time to
+    first byte) and ``total`` to seconds since the request started.
+    """
+
+    def __init__(self, url, status, headers, body, size, timing):
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.size = size
+        self.timing = timing
+
+    def json(self):
+        """Decode the body as JSON."""
+        return json.loads(self.body)
+
+    def raise_for_status(self):
+        """Raise :class:`HTTPError` if the status is an error status."""
+        if self.status >= 400:
+            raise HTTPError(self)
+
+
+def _encode(value):
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    return value
+
+
+class Transport(object):
+    """Makes HTTP requests. Subclasses implement `_perform`.
+
+    If ``deadline`` is set, all requests made with the transport,
+    including their retries and the waits between them, must be done
+    within that many seconds of its creation. Each attempt's timeout is
+    cut short to fit and no retries are made that couldn't finish in
+    time, so a background job's transport can be kept within the job's
+    own deadline.
+
+    Not thread-safe: use one transport per thread.
+    """
+
+    __metaclass__ = abc.ABCMeta
+
+    name = None
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, timeout=TIMEOUT,
+                 retries=RETRIES, retry_delay=RETRY_DELAY, deadline=None,
+                 logger=None):
+        self.connect_timeout = connect_timeout
+        self.timeout = timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.deadline = None
+        if deadline is not None:
+            self.deadline = time.time() + deadline
+        self.logger = logger
+
+    def _remaining(self):
+        """Return seconds left until the deadline or `None`."""
+        if self.deadline is None:
+            return None
+        return self.deadline - time.time()
+
+    def _expires_within(self, seconds):
+        """Whether the deadline passes within ``seconds``."""
+        remaining = self._remaining()
+        return remaining is not None and remaining <= seconds
+
+    def close(self):
+        """Close the transport's connections."""
+
+    def request(self, method, url, params=None, data=None, headers=None,
+                progress=None):
+        """Make a request and return its :class:`Response`.
+
+        ``params`` are added to the URL's query string. ``progress`` is
+        called with the expected and the received number of bytes while
+        the response is downloading.
+
+        Requests with an idempotent method are retried if they fail or
+        the server is (temporarily) unavailable, as long as the retry
+        can start before the transport's deadline. Raises
+        :class:`TransportError` if the last attempt failed without a
+        response or the deadline has passed.
+        """
+        if params:
+            query = urlencode([(_encode(k), _encode(v))
+                               for k, v in params.items()])
+            url += ('&' if '?' in url else '?') + query
+
+        headers = dict((_encode(k), _encode(v))
+                       for k, v in (headers or {}).items())
+        retries = self.retries if method in IDEMPOTENT_METHODS else 0
+        delay = self.retry_delay
+
+        for attempt in range(retries + 1):
+            timeout = self.timeout
+            remaining = self._remaining()
+            if remaining is not None:
+                if remaining <= 0:
+                    raise TransportError('Deadline passed before {0} '
+                                         '{1}'.format(method,
+                                                      url.split('?')[0]))
+                timeout = min(timeout, remaining)
+
+            try:
+                response = self._perform(method, _encode(url), _encode(data),
+                                         headers, progress, timeout)
+            except TransportError as err:
+                if attempt == retries or self._expires_within(delay):
+                    raise
+                reason = err
+            else:
+                if (response.status not in RETRY_STATUSES or
+                        attempt == retries or self._expires_within(delay)):
+                    return response
+                reason = 'HTTP {0}'.format(response.status)
+
+            if self.logger:
+                self.logger.warning('%s %s failed (%s), retrying in %gs',
+                                    method, url.split('?')[0], reason, delay)
+            time.sleep(delay)
+            delay *= 2
+
+    def get(self, url, params=None, headers=None, progress=None):
+        """Make a GET request. Arguments as for :meth:`request`."""
+        return self.request('GET', url, params, headers=headers,
+                            progress=progress)
+
+    @abc.abstractmethod
+    def _perform(self, method, url, data, headers, progress, timeout):
+        """Make a single request. Return a :class:`Response`.
+
+        ``timeout`` is the total timeout of this attempt in seconds.
+        Raise :class:`TransportError` if the request failed without a
+        response.
+        """
+
+
+class CurlTransport(Transport):
+    """:class:`Transport` that uses pycurl.
+
+    The same curl handle is used for every request, so libcurl keeps
+    the connections open.
+    """
+
+    name = 'pycurl'
+
+    def __init__(self, **kwargs):
+        from lib import pycurl
+
+        super(CurlTransport, self).__init__(**kwargs)
+        self._pycurl = pycurl
+        self._curl = pycurl.Curl()
+
+    def close(self):
+        self._curl.close()
+
+    def _perform(self, method, url, data, headers, progress, timeout):
+        c = self._curl
+        c.reset()  # keeps open connections
+
+        body = StringIO()
+        header_lines = []
+
+        c.setopt(c.URL, url)
+        if method == 'GET':
+            c.setopt(c.HTTPGET, True)
+        else:
+            c.setopt(c.CUSTOMREQUEST, method)
+            if data is not None:
+                c.setopt(c.POSTFIELDS, data)
+
+        c.setopt(c.HTTPHEADER, ['{0}: {1}'.format(k, v)
+                                for k, v in headers.items()])
+        c.setopt(c.ENCODING, b'')  # accept and decode any compression
+        c.setopt(c.FOLLOWLOCATION, True)
+        c.setopt(c.CONNECTTIMEOUT_MS,
+                 int(min(self.connect_timeout, timeout) * 1000))
+        c.setopt(c.TIMEOUT_MS, int(timeout * 1000))
+        c.setopt(c.NOSIGNAL, True)
+        c.setopt(c.WRITEFUNCTION, body.write)
+        c.setopt(c.HEADERFUNCTION, header_lines.append)
+
+        if progress is not None:
+            def xferinfo(download_total, downloaded, upload_total, uploaded):
+                progress(download_total, downloaded)
+                return 0
+
+            c.setopt(c.NOPROGRESS, False)
+            c.setopt(c.XFERINFOFUNCTION, xferinfo)
+
+        try:
+            c.perform()
+        except self._pycurl.error as err:
+            raise TransportError(err.args[-1])
+
+        # Only keep the headers of the last response, e.g. after redirects
+        headers = web.CaseInsensitiveDictionary()
+        for line in header_lines:
+            line = line.decode('iso-8859-1').strip()
+            if line.startswith('HTTP/'):
+                headers = web.CaseInsensitiveDictionary()
+            elif ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip()] = value.strip()
+
+        timing = {'connect': c.getinfo(c.CONNECT_TIME),
+                  'ttfb': c.getinfo(c.STARTTRANSFER_TIME),
+                  'total': c.getinfo(c.TOTAL_TIME)}
+
+        return Response(url, c.getinfo(c.RESPONSE_CODE), headers,
+                        body.getvalue(), int(c.getinfo(c.SIZE_DOWNLOAD)),
+                        timing)
+
+
+class UrllibTransport(Transport):
+    """:class:`Transport` that uses a `workflow.web.Session`.
+
+    urllib2 has a single socket timeout, which can't be shorter than the
+    time the API takes to start answering, so it's the total timeout.
+    The total timeout is also checked between reads.
+    """
+
+    name = 'urllib2'
+
+    def __init__(self, **kwargs):
+        super(UrllibTransport, self).__init__(**kwargs)
+        self._session = web.Session(timeout=self.timeout)
+
+    def close(self):
+        self._session.close()
+
+    def _perform(self, method, url, data, headers, progress, timeout):
+        start = time.time()
+        try:
+            r = self._session.request(method, url, data=data, headers=headers,
+                                      timeout=timeout, allow_redirects=True,
+                                      stream=True)
+            ttfb = time.time() - start
+
+            raw = r.error if r.error is not None else r
+            size = int(raw.headers.get('content-length') or 0)
+
+            # Progress is reported in decompressed bytes
+            expected = size
+            if raw.headers.get('content-encoding'):
+                expected = 0
+
+            if r.error is not None:
+                chunks = iter(lambda: r.error.read(CHUNK_SIZE), b'')
+            else:
+                chunks = r.iter_content(CHUNK_SIZE)
+
+            body = StringIO()
+            for chunk in chunks:
+                body.write(chunk)
+                if progress is not None:
+                    progress(expected, body.tell())
+                if time.time() - start > timeout:
+                    raise TransportError('Operation timed out after '
+                                         '{0:g} seconds'.format(timeout))
+
+        except (EnvironmentError, httplib.HTTPException) as err:
+            raise TransportError(err)
+
+        body = body.getvalue()
+        timing = {'connect': None, 'ttfb': ttfb,
+                  'total': time.time() - start}
+
+        return Response(url, r.status_code,
+                        web.CaseInsensitiveDictionary(raw.headers.items()),
+                        body, size or len(body), timing)
+
+
+def backend_name(wf):
+    """Return the name of the configured backend (see `BACKENDS`)."""
+    name = wf.settings.get('transport', DEFAULT_BACKEND)
+    if name not in BACKENDS:
+        return DEFAULT_BACKEND
+    return name
+
+
+def get_transport(wf, **kwargs):
+    """Return a :class:`Transport` using the configured backend.
+
+    Falls back to urllib2 if pycurl can't be loaded. ``kwargs`` are
+    passed to the transport.
+    """
+    kwargs.setdefault('logger', wf.logger)
+
+    if backend_name(wf) == 'pycurl':
+        try:
+            return CurlTransport(**kwargs)
+        except ImportError as err:
+            wf.logger.warning("Can't load pycurl, using urllib2: %s", err)
+
+    return UrllibTransport(**kwargs)
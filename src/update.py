@@ -4,23 +4,85 @@
 from __future__ import unicode_literals
 
 import argparse
+import sys
+import time
 from workflow import Workflow, PasswordNotFound
+from workflow.background import report_metrics, report_progress
+
+import generations
+from projects import delete_legacy_caches, has_store, write_generation
+from transport import get_transport
+
+# Seconds between progress reports while a response is downloading
+PROGRESS_INTERVAL = 0.5
+
+# Seconds all requests of a sync may take, retries included. Shorter than
+# the deadline `10000ft.py` runs this script with (UPDATE_TIMEOUT), so a
+# slow sync fails and is recorded instead of being killed mid-retry
+REQUEST_DEADLINE = 240
 
 # Will be populated later
 log = None
 
 
-def get_projects(api_key):
+class SyncProgress(object):
+    """Publishes the progress of the sync for the Script Filter to show."""
+
+    def __init__(self):
+        self.phase = None
+        self.pages = 0
+        self.records = 0
+        self.received = 0  # bytes of finished responses
+        self._receiving = 0  # bytes of the response being downloaded
+        self._reported = 0
+        self.endpoints = {}  # metrics of each phase's requests
+
+    def start(self, phase):
+        """Start the next phase of the sync."""
+        self.phase = phase
+        self._receiving = 0
+        self.report()
+
+    def transfer(self, download_total, downloaded):
+        """Record download progress. A `Transport` progress callback."""
+        self._receiving = downloaded
+        if time.time() - self._reported >= PROGRESS_INTERVAL:
+            self.report()
+
+    def page_done(self, records):
+        """Record a downloaded and parsed page of ``records`` records."""
+        self.pages += 1
+        self.records += records
+        self.received += self._receiving
+        self._receiving = 0
+        self.report()
+
+    def request_done(self, response, records):
+        """Record the metrics of the `transport.Response` ``response``,
+        which contained ``records`` records.
+        """
+        self.endpoints[self.phase] = {
+            'bytes': response.size,
+            'records': records,
+            'ttfb': round(response.timing['ttfb'], 3),
+            'time': round(response.timing['total'], 3),
+        }
+        report_metrics(endpoints=self.endpoints, bytes=sum(
+            e['bytes'] for e in self.endpoints.values()))
+        self.page_done(records)
+
+    def report(self):
+        """Publish the progress (see `report_progress`)."""
+        self._reported = time.time()
+        report_progress(phase=self.phase, pages=self.pages,
+                        records=self.records,
+                        received=self.received + self._receiving)
+
+
+def get_projects(api_key, progress, transport):
     """Retrieve all projects from 10.000ft
     Returns a list of project dictionaries.
     """
-    import json
-    from lib import pycurl
-    from StringIO import StringIO
-    from urllib import urlencode
-
-    buffer = StringIO()
-
     # Set variables
     url = 'https://api.10000ft.com/api/v1/projects/'
     params = {'auth': api_key,
@@ -37,21 +99,17 @@ def get_projects(api_key):
               # 'with_phases' : 'false',
               'per_page': 10000,
               }
-    params = urlencode(params, 'utf-8')
 
     # Do the request
-    c = pycurl.Curl()
-    c.setopt(c.URL, url + '?' + params)
-    c.setopt(c.WRITEDATA, buffer)
-    c.perform()
-    c.close()
+    response = transport.get(url, params, progress=progress.transfer)
+    response.raise_for_status()
 
     # Parse the JSON returned by 10.000ft and extract the projects
-    result = buffer.getvalue()
-    result = json.loads(result)
+    result = response.json()
 
     # Store the result in a projects library
     projects = result['data']
+    progress.request_done(response, len(projects))
 
     # Cycle through projects to modify data if necessary
     for project in projects:
@@ -64,17 +122,10 @@ def get_projects(api_key):
     return projects
 
 
-def get_clients(api_key):
+def get_clients(api_key, progress, transport):
     """Retrieve all client tags from 10.000ft
     Returns a list of client tag dictionaries.
     """
-    import json
-    from lib import pycurl
-    from StringIO import StringIO
-    from urllib import urlencode
-
-    buffer = StringIO()
-
     # Set variables
     url = 'https://api.10000ft.com/api/v1/tags'
     params = {'auth': api_key,
@@ -86,21 +137,16 @@ def get_clients(api_key):
               'per_page': 10000,
               }
 
-    params = urlencode(params, 'utf-8')
-
     # Do the request
-    c = pycurl.Curl()
-    c.setopt(c.URL, url + '?' + params)
-    c.setopt(c.WRITEDATA, buffer)
-    c.perform()
-    c.close()
+    response = transport.get(url, params, progress=progress.transfer)
+    response.raise_for_status()
 
     # Parse the JSON returned by 10.000ft and extract the clients
-    result = buffer.getvalue()
-    result = json.loads(result)
+    result = response.json()
 
     # Store the result in a projects library
     clients = result['data']
+    progress.request_done(response, len(clients))
 
     # Return projects as a library with updated data
     return clients
@@ -120,7 +166,7 @@ def main(wf):
 
     args = parser.parse_args(wf.args)
 
-    log.debug('update_method = ' + str(args.update_method))
+    log.debug('update_method = %s', args.update_method)
 
     ####################################################################
     # Run argument-specific actions
@@ -135,55 +181,69 @@ def main(wf):
     # Get data the data from 10.000ft
     ####################################################################
 
-    try:
-        # Get API key from Keychain
-        api_key = wf.get_password('10k_api_key')
+    current = generations.current(wf)
+    progress = SyncProgress()
 
-        # Retrieve projects from cache if available and no more than 600
-        # seconds old
+    if current is not None and current.age < max_age:
+        if has_store(wf, current):
+            log.info('Data of generation %s is less than %d second(s) old',
+                     current.name, max_age)
+            return 0
 
-        def wrapper():
-            """`cached_data` can only take a bare callable (no args),
-            so we need to wrap callables needing arguments in a function
-            that needs none.
-            """
-            return get_projects(api_key)
+        # The store setting was changed: build the store from the
+        # current data instead of fetching it again
+        projects = current.load('projects')
+        clients = current.load('clients')
 
-        # Get the new data
-        projects = wf.cached_data('projects', wrapper, max_age=max_age)
+    else:
+        try:
+            # Get API key from Keychain
+            api_key = wf.get_password('10k_api_key')
+        except PasswordNotFound:  # API key has not yet been set
+            # Nothing we can do about this, so just log it
+            log.error('No API key saved')
+            return 0
+
+        # Get the new data over one connection
+        transport = get_transport(wf, deadline=REQUEST_DEADLINE)
+        try:
+            progress.start('projects')
+            projects = get_projects(api_key, progress, transport)
+            progress.start('clients')
+            clients = get_clients(api_key, progress, transport)
+        finally:
+            transport.close()
 
         # Record our progress in the log file
-        log.info('{} projects cached, max_age {} second(s)'.format(
-            len(projects), max_age))
+        log.info('%d projects and %d clients fetched',
+                 len(projects), len(clients))
 
-    except PasswordNotFound:  # API key has not yet been set
-        # Nothing we can do about this, so just log it
-        log.error('No API key saved')
+    ####################################################################
+    # Publish the data
+    ####################################################################
 
-    try:
-        # Get API key from Keychain
-        api_key = wf.get_password('10k_api_key')
+    # Write everything to a new generation and then switch the Script
+    # Filter over to it in one go, so it never sees a mix of old and
+    # new data
+    progress.start('publishing')
+    generation = generations.create(wf)
+    write_generation(wf, generation, projects, clients)
+    generations.publish(wf, generation)
+    report_metrics(records=len(projects) + len(clients))
 
-        # Retrieve projects from cache if available and no more than 600
-        # seconds old
+    generations.collect_garbage(wf)
+    delete_legacy_caches(wf)
 
-        def wrapper():
-            """`cached_data` can only take a bare callable (no args),
-            so we need to wrap callables needing arguments in a function
-            that needs none.
-            """
-            return get_clients(api_key)
 
-        # Get the new data
-        clients = wf.cached_data('clients', wrapper, max_age=max_age)
-        # Record our progress in the log file
-        log.debug('{} clients cached, max_age {} second(s)'.format(
-            len(clients), max_age))
-
-    except PasswordNotFound:  # API key has not yet been set
-        # Nothing we can do about this, so just log it
-        log.error('No API key saved')
 if __name__ == '__main__':
     wf = Workflow()
     log = wf.logger
-    wf.run(main)
+    retcode = wf.run(main)
+
+    # Sweep the cache directory now, so the background runner doesn't
+    # have to
+    wf.cache_manager.run()
+
+    # Let the background runner know whether the sync failed, so it can
+    # back off
+    sys.exit(retcode)
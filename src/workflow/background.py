@@ -19,15 +19,35 @@ and examples.
 
 from __future__ import print_function, unicode_literals
 
+import json
+import logging
 import signal
 import sys
 import os
 import subprocess
-import pickle
+import time
 
 from workflow import Workflow
+from util import atomic_writer, fork
 
-__all__ = ['is_running', 'run_in_background']
+__all__ = ['is_running', 'job_health', 'job_history', 'job_names',
+           'job_stats', 'job_status', 'last_result', 'report_metrics',
+           'report_progress', 'run_in_background']
+
+#: Seconds an overrunning job gets to exit after ``SIGTERM`` before
+#: it's sent ``SIGKILL``
+KILL_GRACE = 5
+
+#: Seconds between the watchdog's checks on a job with a deadline
+WATCHDOG_INTERVAL = 0.1
+
+#: Number of runs kept in a job's history
+HISTORY_SIZE = 50
+
+#: Seconds a job should not be retried for after it failed once. Doubles
+#: with every further consecutive failure up to :data:`BACKOFF_MAX`
+BACKOFF_BASE = 30
+BACKOFF_MAX = 3600
 
 _wf = None
 
@@ -43,28 +63,53 @@ def _log():
     return wf().logger
 
 
-def _arg_cache(name):
-    """Return path to pickle cache file for arguments.
+def _pid_file(name):
+    """Return path to PID file for ``name``.
 
     :param name: name of task
     :type name: ``unicode``
-    :returns: Path to cache file
+    :returns: Path to PID file for task
     :rtype: ``unicode`` filepath
 
     """
-    return wf().cachefile(name + '.argcache')
+    return wf().cachefile(name + '.pid')
 
 
-def _pid_file(name):
-    """Return path to PID file for ``name``.
+def _status_file(name):
+    """Return path to progress status file for ``name``.
 
     :param name: name of task
     :type name: ``unicode``
-    :returns: Path to PID file for task
+    :returns: Path to status file for task
     :rtype: ``unicode`` filepath
 
     """
-    return wf().cachefile(name + '.pid')
+    return wf().cachefile(name + '.status')
+
+
+def _history_file(name):
+    """Return path to the file the results of the runs of ``name`` are
+    saved in.
+
+    :param name: name of task
+    :type name: ``unicode``
+    :returns: Path to history file for task
+    :rtype: ``unicode`` filepath
+
+    """
+    return wf().cachefile(name + '.history')
+
+
+def _metrics_file(name):
+    """Return path to the file the running job ``name`` saves metrics in.
+
+    :param name: name of task
+    :type name: ``unicode``
+    :returns: Path to metrics file for task
+    :rtype: ``unicode`` filepath
+
+    """
+    return wf().cachefile(name + '.metrics')
 
 
 def _process_exists(pid):
@@ -123,9 +168,241 @@ def is_running(name):
     return False
 
 
+def report_progress(**status):
+    r"""Publish the progress of the current background job.
+
+    Call this from the command run by :func:`run_in_background`, e.g.
+    ``report_progress(phase='download', received=1024)``. ``status``
+    replaces the previous status and is written atomically, so readers
+    never see a partial file. It's deleted when the job ends.
+
+    :param \**status: JSON-serializable progress values
+    :returns: ``False`` if not called from a background job, else ``True``
+    :rtype: bool
+
+    """
+    name = os.getenv('_WF_BACKGROUND_JOB')
+    if not name:
+        return False
+
+    status['updated'] = time.time()
+    with atomic_writer(_status_file(name), 'wb') as fp:
+        json.dump(status, fp)
+
+    return True
+
+
+def report_metrics(**metrics):
+    r"""Add measurements to the record of the current background job run.
+
+    Call this from the command run by :func:`run_in_background`, e.g.
+    ``report_metrics(bytes=1024, records=10)``. ``metrics`` are merged
+    into the ones reported earlier in the same run and saved as the
+    ``metrics`` of the run's entry in the :func:`job_history` when the
+    job ends.
+
+    :param \**metrics: JSON-serializable values
+    :returns: ``False`` if not called from a background job, else ``True``
+    :rtype: bool
+
+    """
+    name = os.getenv('_WF_BACKGROUND_JOB')
+    if not name:
+        return False
+
+    path = _metrics_file(name)
+    saved = _read_json(path) or {}
+    saved.update(metrics)
+    with atomic_writer(path, 'wb') as fp:
+        json.dump(saved, fp)
+
+    return True
+
+
+def _read_json(path):
+    """Return the JSON data in ``path`` or ``None``."""
+    try:
+        with open(path, 'rb') as fp:
+            return json.load(fp)
+    except (IOError, ValueError):
+        return None
+
+
+def job_status(name):
+    """Return the progress last published by job ``name``.
+
+    :param name: name of task
+    :type name: unicode
+    :returns: ``dict`` passed to :func:`report_progress` plus the time it
+        was ``updated``, or ``None`` if the job isn't running or hasn't
+        reported any progress
+    :rtype: ``dict``
+
+    """
+    if not is_running(name):
+        return None
+
+    return _read_json(_status_file(name))
+
+
+def job_history(name):
+    """Return the results of the last :data:`HISTORY_SIZE` runs of ``name``.
+
+    :param name: name of task
+    :type name: unicode
+    :returns: results, oldest first. Each is a ``dict`` with the keys
+        ``started`` and ``finished`` (timestamps), ``status`` (exit
+        status of the command or ``None`` if it couldn't be run),
+        ``timed_out`` (whether it was killed for overrunning its
+        deadline) and, if the job called :func:`report_metrics`,
+        ``metrics``
+    :rtype: ``list``
+
+    """
+    return _read_json(_history_file(name)) or []
+
+
+def job_names():
+    """Return the names of the jobs that have a :func:`job_history`.
+
+    :returns: sorted job names
+    :rtype: ``list``
+
+    """
+    return sorted(filename[:-len('.history')]
+                  for filename in os.listdir(wf().cachedir)
+                  if filename.endswith('.history'))
+
+
+def _percentile(values, percent):
+    """Return the ``percent`` percentile of sorted ``values``."""
+    index = int(round(percent / 100.0 * (len(values) - 1)))
+    return values[index]
+
+
+def job_stats(name):
+    """Summarise the recent runs of job ``name``.
+
+    :param name: name of task
+    :type name: unicode
+    :returns: ``dict`` with the number of ``runs``, ``failures`` and
+        ``timeouts`` in the :func:`job_history` and the ``p50`` and
+        ``p95`` of their durations in seconds, or ``None`` if the job
+        has no history. If the runs reported ``endpoints`` metrics with
+        a ``ttfb``, ``endpoints`` maps each endpoint to the ``p50`` and
+        ``p95`` of its time to first byte
+    :rtype: ``dict``
+
+    """
+    history = job_history(name)
+    if not history:
+        return None
+
+    durations = sorted(r['finished'] - r['started'] for r in history)
+    stats = {
+        'runs': len(history),
+        'failures': sum(1 for r in history if _failed(r)),
+        'timeouts': sum(1 for r in history if r['timed_out']),
+        'p50': _percentile(durations, 50),
+        'p95': _percentile(durations, 95),
+        'endpoints': {},
+    }
+
+    ttfbs = {}
+    for result in history:
+        endpoints = result.get('metrics', {}).get('endpoints', {})
+        for endpoint, metrics in endpoints.items():
+            if metrics.get('ttfb') is not None:
+                ttfbs.setdefault(endpoint, []).append(metrics['ttfb'])
+
+    for endpoint, values in ttfbs.items():
+        values.sort()
+        stats['endpoints'][endpoint] = {'p50': _percentile(values, 50),
+                                        'p95': _percentile(values, 95)}
+
+    return stats
+
+
+def last_result(name):
+    """Return the result of the last finished run of job ``name``.
+
+    :param name: name of task
+    :type name: unicode
+    :returns: result as described in :func:`job_history` or ``None`` if
+        the job has never finished
+    :rtype: ``dict``
+
+    """
+    history = job_history(name)
+    if not history:
+        return None
+    return history[-1]
+
+
+def _failed(result):
+    """Whether the job run ``result`` counts as a failure.
+
+    A run without an exit status failed, too: its command couldn't
+    even be started.
+    """
+    return (result['status'] is None or result['status'] != 0 or
+            result['timed_out'])
+
+
+def job_health(name):
+    """Return the circuit-breaker state of job ``name``.
+
+    Every consecutive failure of the job doubles the time, starting at
+    :data:`BACKOFF_BASE` seconds, that it shouldn't be run again for.
+    The circuit is ``closed`` if the last run succeeded, ``open`` while
+    the job is backing off and ``half-open`` once it may be tried again.
+
+    Callers that run a job automatically, e.g. to refresh stale data,
+    should not do so while its circuit is ``open``. Runs the user asked
+    for needn't wait.
+
+    :param name: name of task
+    :type name: unicode
+    :returns: ``dict`` with the keys ``state``, ``failures`` (number of
+        consecutive failures) and ``retry_after`` (timestamp the backoff
+        ends at or ``None``)
+    :rtype: ``dict``
+
+    """
+    history = job_history(name)
+    failures = 0
+    for result in reversed(history):
+        if not _failed(result):
+            break
+        failures += 1
+
+    health = {'state': 'closed', 'failures': failures, 'retry_after': None}
+    if failures:
+        backoff = min(BACKOFF_BASE * 2 ** (failures - 1), BACKOFF_MAX)
+        health['retry_after'] = history[-1]['finished'] + backoff
+        if time.time() < health['retry_after']:
+            health['state'] = 'open'
+        else:
+            health['state'] = 'half-open'
+
+    return health
+
+
+def _record_result(name, result):
+    """Add ``result`` to the history of job ``name``."""
+    history = job_history(name)[-(HISTORY_SIZE - 1):]
+    history.append(result)
+    with atomic_writer(_history_file(name), 'wb') as fp:
+        json.dump(history, fp)
+
+
 def _background(pidfile, stdin='/dev/null', stdout='/dev/null',
                 stderr='/dev/null'):  # pragma: no cover
-    """Fork the current process into a background daemon.
+    """Fork a background daemon from the current process.
+
+    Returns in both the calling process and the daemon. The calling
+    process only waits for the short-lived intermediate process, which
+    writes the daemon's PID to ``pidfile`` and exits.
 
     :param pidfile: file to write PID of daemon process to.
     :type pidfile: filepath
@@ -135,33 +412,44 @@ def _background(pidfile, stdin='/dev/null', stdout='/dev/null',
     :type stdout: filepath
     :param stderr: where to write stderr output
     :type stderr: filepath
+    :returns: ``None`` in the daemon, exit status of the intermediate
+        process in the calling process
+    :rtype: ``int`` or ``None``
 
     """
-    def _fork_and_exit_parent(errmsg, wait=False, write=False):
-        try:
-            pid = os.fork()
-            if pid > 0:
-                if write:  # write PID of child process to `pidfile`
-                    tmp = pidfile + '.tmp'
-                    with open(tmp, 'wb') as fp:
-                        fp.write(str(pid))
-                    os.rename(tmp, pidfile)
-                if wait:  # wait for child process to exit
-                    os.waitpid(pid, 0)
-                os._exit(0)
-        except OSError as err:
-            _log().critical('%s: (%d) %s', errmsg, err.errno, err.strerror)
-            raise err
-
-    # Do first fork and wait for second fork to finish.
-    _fork_and_exit_parent('fork #1 failed', wait=True)
-
-    # Decouple from parent environment.
-    os.chdir(wf().workflowdir)
-    os.setsid()
-
-    # Do second fork and write PID to pidfile.
-    _fork_and_exit_parent('fork #2 failed', write=True)
+    # Don't let the children write the caller's buffered output again
+    sys.stdout.flush()
+    sys.stderr.flush()
+
+    # Do first fork and wait for second fork to finish. The caller may
+    # have other threads, so fork via `util.fork` to reset the locks they
+    # may be holding
+    try:
+        pid = fork()
+    except OSError as err:
+        _log().critical('fork #1 failed: (%d) %s', err.errno, err.strerror)
+        raise err
+
+    if pid > 0:
+        return os.waitpid(pid, 0)[1]
+
+    # The first child must never return to the caller's code
+    try:
+        # Decouple from parent environment.
+        os.chdir(wf().workflowdir)
+        os.setsid()
+
+        # Do second fork and write PID to pidfile.
+        pid = os.fork()
+        if pid > 0:
+            tmp = pidfile + '.tmp'
+            with open(tmp, 'wb') as fp:
+                fp.write(str(pid))
+            os.rename(tmp, pidfile)
+            os._exit(0)
+    except Exception:
+        _log().exception('fork #2 failed')
+        os._exit(1)
 
     # Now I am a daemon!
     # Redirect standard file descriptors.
@@ -175,6 +463,118 @@ def _background(pidfile, stdin='/dev/null', stdout='/dev/null',
     if hasattr(sys.stderr, 'fileno'):
         os.dup2(se.fileno(), sys.stderr.fileno())
 
+    for fp in (si, so, se):
+        fp.close()
+
+    _close_inherited_files()
+
+
+def _close_inherited_files():  # pragma: no cover
+    """Close all files but stdin, stdout and stderr in the daemon.
+
+    The daemon mustn't keep the caller's sockets, pipes or locked
+    lockfiles open, or pass them on to the command. Log files are
+    closed via their handlers, which reopen them when they're next
+    written to.
+    """
+    for ref in logging._handlerList:
+        handler = ref()
+        if isinstance(handler, logging.FileHandler) and handler.stream:
+            handler.stream.close()
+            handler.stream = None
+
+    try:
+        maxfd = os.sysconf(b'SC_OPEN_MAX')
+    except (AttributeError, ValueError):
+        maxfd = 256
+
+    os.closerange(3, maxfd)
+
+
+def _wait(name, proc, timeout):  # pragma: no cover
+    """Wait for ``proc`` to exit, killing it if it overruns ``timeout``.
+
+    The process is sent ``SIGTERM`` when its deadline passes and
+    ``SIGKILL`` if it hasn't exited :data:`KILL_GRACE` seconds later.
+    It is always reaped.
+
+    :returns: ``(exit status, timed out)``
+    :rtype: ``tuple``
+
+    """
+    if not timeout:
+        return proc.wait(), False
+
+    deadline = time.time() + timeout
+    while proc.poll() is None:
+        if time.time() >= deadline:
+            break
+        time.sleep(WATCHDOG_INTERVAL)
+    else:
+        return proc.returncode, False
+
+    _log().error('[%s] job exceeded its deadline of %0.1fs, terminating...',
+                 name, timeout)
+    proc.terminate()
+
+    deadline = time.time() + KILL_GRACE
+    while proc.poll() is None:
+        if time.time() >= deadline:
+            _log().error('[%s] job ignored SIGTERM, killing...', name)
+            proc.kill()
+            break
+        time.sleep(WATCHDOG_INTERVAL)
+
+    return proc.wait(), True
+
+
+def _run_job(name, args, kwargs, pidfile, timeout):  # pragma: no cover
+    """Run job ``name`` in the daemon, then clean up after it."""
+    log = _log()
+
+    # Tell the job it's running in the background
+    env = dict(kwargs.get('env') or os.environ)
+    env['_WF_BACKGROUND_JOB'] = name
+    kwargs['env'] = env
+
+    # Don't attribute a killed run's metrics to this one
+    if os.path.exists(_metrics_file(name)):
+        os.unlink(_metrics_file(name))
+
+    result = {'started': time.time(), 'status': None, 'timed_out': False}
+    try:
+        # Run the command
+        log.debug('[%s] running command: %r', name, args)
+
+        proc = subprocess.Popen(args, **kwargs)
+        result['status'], result['timed_out'] = _wait(name, proc, timeout)
+
+        if result['status']:
+            log.error('[%s] command failed with status %d', name,
+                      result['status'])
+    finally:
+        result['finished'] = time.time()
+        metrics = _read_json(_metrics_file(name))
+        if metrics:
+            result['metrics'] = metrics
+            os.unlink(_metrics_file(name))
+
+        _record_result(name, result)
+
+        os.unlink(pidfile)
+        if os.path.exists(_status_file(name)):
+            os.unlink(_status_file(name))
+
+    log.debug('[%s] job complete', name)
+
+    # Keep the cache directory in bounds while nobody's waiting
+    try:
+        evicted = wf().cache_manager.run()
+        if evicted:
+            log.debug('[%s] evicted %d cache file(s)', name, len(evicted))
+    except Exception:
+        log.exception('[%s] could not sweep cache directory', name)
+
 
 def kill(name, sig=signal.SIGTERM):
     """Send a signal to job ``name`` via :func:`os.kill`.
@@ -196,27 +596,38 @@ def kill(name, sig=signal.SIGTERM):
     return True
 
 
-def run_in_background(name, args, **kwargs):
-    r"""Cache arguments then call this script again via :func:`subprocess.call`.
+def run_in_background(name, args, timeout=None, **kwargs):
+    r"""Run a command in a background daemon process.
 
     :param name: name of job
     :type name: unicode
     :param args: arguments passed as first argument to :func:`subprocess.call`
+    :param timeout: deadline for the command in seconds. ``None`` means
+        it may run forever
+    :type timeout: ``int`` or ``float``
     :param \**kwargs: keyword arguments to :func:`subprocess.call`
-    :returns: exit code of sub-process
+    :returns: exit code of the process that starts the daemon
     :rtype: int
 
-    When you call this function, it caches its arguments and then calls
-    ``background.py`` in a subprocess. The Python subprocess will load the
-    cached arguments, fork into the background, and then run the command you
-    specified.
+    The daemon is forked directly from the calling process, so the
+    arguments are passed in memory and no Python interpreter has to
+    start before this function returns. The daemon then runs the command
+    you specified, removes the job's PID file when it's done and sweeps
+    the cache directory (see :attr:`Workflow.cache_manager
+    <workflow.Workflow.cache_manager>`).
 
-    This function will return as soon as the ``background.py`` subprocess has
-    forked, returning the exit code of *that* process (i.e. not of the command
-    you're trying to run).
+    This function will return as soon as the daemon has been started.
+    It returns the exit code of the process that starts the daemon
+    (i.e. not of the command you're trying to run).
 
     If that process fails, an error will be written to the log file.
 
+    A command that is still running ``timeout`` seconds after it was
+    started is killed, so a hung job can't block new runs of the job
+    forever. Whether it was is recorded in the job's
+    :func:`job_history`, which :func:`job_health` derives the job's
+    backoff from.
+
     If a process is already running under the same name, this function will
     return immediately and will not run the specified command.
 
@@ -225,17 +636,18 @@ def run_in_background(name, args, **kwargs):
         _log().info('[%s] job already running', name)
         return
 
-    argcache = _arg_cache(name)
-
-    # Cache arguments
-    with open(argcache, 'wb') as fp:
-        pickle.dump({'args': args, 'kwargs': kwargs}, fp)
-        _log().debug('[%s] command cached: %s', name, argcache)
+    pidfile = _pid_file(name)
+    retcode = _background(pidfile)
 
-    # Call this script
-    cmd = ['/usr/bin/python', __file__, name]
-    _log().debug('[%s] passing job to background runner: %r', name, cmd)
-    retcode = subprocess.call(cmd)
+    if retcode is None:  # pragma: no cover
+        # In the daemon: run the job and exit without returning to
+        # the caller's code
+        try:
+            _run_job(name, args, kwargs, pidfile, timeout)
+        except Exception:
+            _log().exception('[%s] job failed', name)
+        finally:
+            os._exit(0)
 
     if retcode:  # pragma: no cover
         _log().error('[%s] background runner failed with %d', name, retcode)
@@ -243,51 +655,3 @@ def run_in_background(name, args, **kwargs):
         _log().debug('[%s] background job started', name)
 
     return retcode
-
-
-def main(wf):  # pragma: no cover
-    """Run command in a background process.
-
-    Load cached arguments, fork into background, then call
-    :meth:`subprocess.call` with cached arguments.
-
-    """
-    log = wf.logger
-    name = wf.args[0]
-    argcache = _arg_cache(name)
-    if not os.path.exists(argcache):
-        msg = '[{0}] command cache not found: {1}'.format(name, argcache)
-        log.critical(msg)
-        raise IOError(msg)
-
-    # Fork to background and run command
-    pidfile = _pid_file(name)
-    _background(pidfile)
-
-    # Load cached arguments
-    with open(argcache, 'rb') as fp:
-        data = pickle.load(fp)
-
-    # Cached arguments
-    args = data['args']
-    kwargs = data['kwargs']
-
-    # Delete argument cache file
-    os.unlink(argcache)
-
-    try:
-        # Run the command
-        log.debug('[%s] running command: %r', name, args)
-
-        retcode = subprocess.call(args, **kwargs)
-
-        if retcode:
-            log.error('[%s] command failed with status %d', name, retcode)
-    finally:
-        os.unlink(pidfile)
-
-    log.debug('[%s] job complete', name)
-
-
-if __name__ == '__main__':  # pragma: no cover
-    wf().run(main)
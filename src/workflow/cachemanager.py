@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# encoding: utf-8
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+
+"""Keep the cache directory within a size and entry budget.
+
+Nothing else removes session caches, the leftovers of background jobs,
+release caches or rotated logs from the cache directory. A
+:class:`CacheManager` evicts files that haven't been used for
+:attr:`~CacheManager.max_age` seconds and then the least recently used
+files until the directory is within budget.
+
+Sweeping the directory means listing it, so it isn't done while the
+user is waiting: :func:`~workflow.background.run_in_background` jobs
+call :meth:`CacheManager.run` when they finish, which only sweeps if
+the last sweep (recorded in a small manifest file) is older than
+:attr:`~CacheManager.interval`.
+"""
+
+from __future__ import print_function, unicode_literals
+
+import errno
+import fnmatch
+import json
+import os
+import stat
+import time
+
+from util import LockFile, atomic_writer
+
+#: Name of the manifest file in the cache directory
+MANIFEST_FILENAME = '.cachemanager.json'
+
+#: Default maximum total size of the cache directory in bytes
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+
+#: Default maximum number of files in the cache directory
+DEFAULT_MAX_ENTRIES = 500
+
+#: Default number of seconds after which an unused file is evicted
+DEFAULT_MAX_AGE = 14 * 86400
+
+#: Default number of seconds between sweeps
+DEFAULT_INTERVAL = 3600
+
+#: Files used within this number of seconds are never evicted, as they
+#: may be in the middle of being written or read
+GRACE_PERIOD = 60
+
+# fnmatch patterns of filenames no `CacheManager` evicts (see `always_keep`)
+_always_keep = []
+
+
+def always_keep(pattern):
+    """Never evict files matching ``pattern`` from any cache directory.
+
+    Unlike a :class:`CacheManager`'s ``keep`` list, this applies to the
+    sweeps that background jobs run, too, as long as they're started
+    after this is called, e.g. at import time.
+
+    Args:
+        pattern (unicode): :mod:`fnmatch` pattern of filenames.
+
+    """
+    if pattern not in _always_keep:
+        _always_keep.append(pattern)
+
+
+class CacheManager(object):
+    """Evicts files from a cache directory.
+
+    Only files directly in ``dirpath`` are managed. Subdirectories are
+    left alone, as are lockfiles, PID files of running processes, the
+    manifest itself and files matching one of the ``keep`` patterns or
+    a pattern passed to :func:`always_keep`.
+
+    Args:
+        dirpath (unicode): Cache directory to manage.
+        max_bytes (int, optional): Maximum total size of the files.
+        max_entries (int, optional): Maximum number of files.
+        max_age (int, optional): Seconds after which unused files are
+            evicted.
+        interval (int, optional): Seconds between sweeps by :meth:`run`.
+        keep (list, optional): :mod:`fnmatch` patterns of filenames
+            that are never evicted.
+
+    """
+
+    def __init__(self, dirpath, max_bytes=DEFAULT_MAX_BYTES,
+                 max_entries=DEFAULT_MAX_ENTRIES, max_age=DEFAULT_MAX_AGE,
+                 interval=DEFAULT_INTERVAL, keep=None):
+        """Create new :class:`CacheManager` for ``dirpath``."""
+        self.dirpath = dirpath
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self.interval = interval
+        self.keep = list(keep or [])
+        self.manifest_path = os.path.join(dirpath, MANIFEST_FILENAME)
+
+    @property
+    def manifest(self):
+        """Results of the last sweep or ``None`` if there wasn't one.
+
+        A ``dict`` with the keys ``swept`` (timestamp), ``bytes`` and
+        ``entries`` (size of the directory after the sweep) and
+        ``evicted`` (number of files evicted).
+        """
+        try:
+            with open(self.manifest_path, 'rb') as fp:
+                return json.load(fp)
+        except (IOError, ValueError):
+            return None
+
+    def due(self):
+        """Whether the last sweep is older than :attr:`interval`.
+
+        Costs a single :func:`os.stat` call.
+        """
+        try:
+            swept = os.stat(self.manifest_path).st_mtime
+        except OSError:
+            return True
+
+        return time.time() - swept >= self.interval
+
+    def run(self):
+        """Sweep the directory if it's :meth:`due`.
+
+        Does nothing if another process is already sweeping it.
+
+        Returns:
+            list: Names of evicted files.
+
+        """
+        if not self.due():
+            return []
+
+        lock = LockFile(self.manifest_path)
+        if not lock.acquire(blocking=False):
+            return []
+
+        try:
+            return self.sweep()
+        finally:
+            lock.release()
+
+    def sweep(self):
+        """Evict expired files, then least recently used ones.
+
+        Files are evicted until there are at most :attr:`max_entries`
+        files with a total size of at most :attr:`max_bytes`. A file's
+        last use is the later of its access and modification times.
+
+        Returns:
+            list: Names of evicted files.
+
+        """
+        now = time.time()
+        entries = []  # (last used, size, filename)
+        total = 0
+        count = 0
+
+        for filename in os.listdir(self.dirpath):
+            path = os.path.join(self.dirpath, filename)
+            try:
+                st = os.stat(path)
+            except OSError:  # deleted in the meantime
+                continue
+
+            if not stat.S_ISREG(st.st_mode):
+                continue
+
+            total += st.st_size
+            count += 1
+
+            used = max(st.st_atime, st.st_mtime)
+            if now - used < GRACE_PERIOD or self._is_protected(filename):
+                continue
+
+            entries.append((used, st.st_size, filename))
+
+        evicted = []
+        for used, size, filename in sorted(entries):
+            if (now - used < self.max_age and total <= self.max_bytes and
+                    count <= self.max_entries):
+                break
+
+            try:
+                os.unlink(os.path.join(self.dirpath, filename))
+            except OSError:
+                continue
+
+            total -= size
+            count -= 1
+            evicted.append(filename)
+
+        with atomic_writer(self.manifest_path, 'wb') as fp:
+            json.dump({'swept': now, 'bytes': total, 'entries': count,
+                       'evicted': len(evicted)}, fp)
+
+        return evicted
+
+    def _is_protected(self, filename):
+        """Whether ``filename`` must never be evicted."""
+        if filename == MANIFEST_FILENAME or filename.endswith('.lock'):
+            return True
+
+        for pattern in self.keep + _always_keep:
+            if fnmatch.fnmatch(filename, pattern):
+                return True
+
+        if filename.endswith('.pid'):
+            return self._pid_running(os.path.join(self.dirpath, filename))
+
+        return False
+
+    def _pid_running(self, path):
+        """Whether the process in PID file ``path`` is running."""
+        try:
+            with open(path, 'rb') as fp:
+                pid = int(fp.read().strip())
+            os.kill(pid, 0)
+        except (IOError, ValueError):
+            return False
+        except OSError as err:
+            # Exists, but belongs to another user
+            return err.errno == errno.EPERM
+
+        return True
@@ -36,8 +36,12 @@ import web
 
 RELEASES_BASE = 'https://api.github.com/repos/{0}/releases'
 
+#: Subdirectory of the cache directory GitHub's responses are cached in
+HTTP_CACHE_DIRNAME = 'http'
+
 
 _wf = None
+_session = None
 
 
 def wf():
@@ -48,6 +52,19 @@ def wf():
     return _wf
 
 
+def session():
+    """Lazy `web.Session` that caches GitHub's responses.
+
+    GitHub sends a ``max-age`` and an ``ETag`` with its API responses, so
+    releases are only downloaded again if they have changed.
+    """
+    global _session
+    if _session is None:
+        cache = web.HTTPCache(wf().cachefile(HTTP_CACHE_DIRNAME))
+        _session = web.Session(cache=cache)
+    return _session
+
+
 class Version(object):
     """Mostly semantic versioning.
 
@@ -211,10 +228,8 @@ def download_workflow(url):
     wf().logger.debug(
         'downloading updated workflow from `%s` to `%s` ...', url, local_path)
 
-    response = web.get(url)
-
-    with open(local_path, 'wb') as output:
-        output.write(response.content)
+    response = web.get(url, stream=True)
+    response.save_to_path(local_path)
 
     return local_path
 
@@ -307,13 +322,7 @@ def get_valid_releases(github_slug, prereleases=False):
 
     wf().logger.debug('retrieving releases list: %s', api_url)
 
-    def retrieve_releases():
-        wf().logger.info(
-            'retrieving releases: %s', github_slug)
-        return web.get(api_url).json()
-
-    slug = github_slug.replace('/', '-')
-    for release in wf().cached_data('gh-releases-' + slug, retrieve_releases):
+    for release in session().get(api_url).json():
 
         release = _validate_release(release)
         if release is None:
@@ -18,11 +18,13 @@ from contextlib import contextmanager
 import errno
 import fcntl
 import functools
+import logging
 import os
+import Queue
 import signal
 import subprocess
 import sys
-from threading import Event
+from threading import Event, RLock, Thread
 import time
 
 # AppleScript to call an External Trigger in Alfred
@@ -290,28 +292,42 @@ class LockFile(object):
     >>>     with open(path, 'wb') as fp:
     >>>         fp.write(data)
 
+    Without a ``timeout``, waiting for the lock happens in the kernel
+    (:func:`fcntl.flock`), so the lock is acquired as soon as it's
+    released. With one, the lock is polled every ``delay`` seconds
+    until the timeout expires.
+
+    Any number of ``shared`` locks can be held at the same time, e.g.
+    by processes reading the protected file, but an exclusive lock
+    (the default) excludes all others.
+
     Args:
         protected_path (unicode): File to protect with a lockfile
         timeout (float, optional): Raises an :class:`AcquisitionError`
             if lock cannot be acquired within this number of seconds.
             If ``timeout`` is 0 (the default), wait forever.
         delay (float, optional): How often to check (in seconds) if
-            lock has been released.
+            lock has been released when polling.
+        shared (bool, optional): Acquire a shared (read) lock instead
+            of an exclusive (write) lock.
 
     Attributes:
         delay (float): How often to check (in seconds) whether the lock
-            can be acquired.
+            can be acquired when polling.
         lockfile (unicode): Path of the lockfile.
+        shared (bool): Whether the lock is shared.
         timeout (float): How long to wait to acquire the lock.
 
     """
 
-    def __init__(self, protected_path, timeout=0.0, delay=0.05):
+    def __init__(self, protected_path, timeout=0.0, delay=0.05,
+                 shared=False):
         """Create new :class:`LockFile` object."""
         self.lockfile = protected_path + '.lock'
         self._lockfile = None
         self.timeout = timeout
         self.delay = delay
+        self.shared = shared
         self._lock = Event()
         atexit.register(self.release)
 
@@ -326,8 +342,8 @@ class LockFile(object):
         If the lock is in use and ``blocking`` is ``False``, return
         ``False``.
 
-        Otherwise, check every :attr:`delay` seconds until it acquires
-        lock or exceeds attr:`timeout` and raises an :class:`AcquisitionError`.
+        Otherwise, wait until the lock is acquired or :attr:`timeout`
+        is exceeded and an :class:`AcquisitionError` is raised.
 
         """
         if self.locked and not blocking:
@@ -337,10 +353,13 @@ class LockFile(object):
         while True:
 
             # Raise error if we've been waiting too long to acquire the lock
-            if self.timeout and (time.time() - start) >= self.timeout:
+            remaining = None
+            if self.timeout:
+                remaining = self.timeout - (time.time() - start)
+                if remaining <= 0:
                     raise AcquisitionError('lock acquisition timed out')
 
-            # If already locked, wait then try again
+            # If already locked by another thread, wait then try again
             if self.locked:
                 time.sleep(self.delay)
                 continue
@@ -349,40 +368,71 @@ class LockFile(object):
             if self._lockfile is None:
                 self._lockfile = open(self.lockfile, 'a')
 
-            # Try to acquire the lock
-            try:
-                fcntl.lockf(self._lockfile, fcntl.LOCK_EX | fcntl.LOCK_NB)
-                self._lock.set()
-                break
-            except IOError as err:  # pragma: no cover
-                if err.errno not in (errno.EACCES, errno.EAGAIN):
-                    raise
+            if self._try_lock(blocking, remaining):
+                # The lockfile may have been deleted and replaced by a
+                # previous holder while we were waiting. Then our lock
+                # is on a dead file and we have to start over
+                try:
+                    current = os.stat(self.lockfile).st_ino
+                except OSError:
+                    current = None
 
-                # Don't try again
-                if not blocking:  # pragma: no cover
-                    return False
+                if current == os.fstat(self._lockfile.fileno()).st_ino:
+                    self._lock.set()
+                    break
 
-                # Wait, then try again
-                time.sleep(self.delay)
+            self._lockfile.close()
+            self._lockfile = None
+
+            # Don't try again
+            if not blocking:
+                return False
 
         return True
 
+    def _try_lock(self, blocking, timeout):
+        """Try to lock :attr:`lockfile` and return ``True`` if locked."""
+        operation = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+        fd = self._lockfile.fileno()
+
+        if blocking and not timeout:
+            fcntl.flock(fd, operation)
+            return True
+
+        try:
+            fcntl.flock(fd, operation | fcntl.LOCK_NB)
+            return True
+        except IOError as err:  # pragma: no cover
+            if err.errno not in (errno.EACCES, errno.EAGAIN):
+                raise
+
+        if blocking:  # poll until the timeout
+            time.sleep(min(self.delay, timeout))
+        return False
+
     def release(self):
-        """Release the lock by deleting `self.lockfile`."""
+        """Release the lock.
+
+        An exclusive lock deletes `self.lockfile`. A shared lock leaves
+        it in place, as other processes may also hold a shared lock.
+
+        """
         if not self._lock.is_set():
             return False
 
         try:
-            fcntl.lockf(self._lockfile, fcntl.LOCK_UN)
-        except IOError:  # pragma: no cover
+            if not self.shared:
+                os.unlink(self.lockfile)
+        except (IOError, OSError):  # pragma: no cover
             pass
         finally:
-            self._lock.clear()
-            self._lockfile = None
             try:
-                os.unlink(self.lockfile)
-            except (IOError, OSError):  # pragma: no cover
+                fcntl.flock(self._lockfile, fcntl.LOCK_UN)
+                self._lockfile.close()
+            except IOError:  # pragma: no cover
                 pass
+            self._lock.clear()
+            self._lockfile = None
 
             return True
 
@@ -400,6 +450,135 @@ class LockFile(object):
         self.release()  # pragma: no cover
 
 
+class QueueHandler(logging.Handler):
+    """Logging handler that writes records from a background thread.
+
+    Records are handed to a queue and written to ``handlers`` by a
+    separate thread, so logging doesn't block on disk I/O. Used by
+    :attr:`Workflow.logger <workflow.Workflow.logger>` in background
+    jobs, which may log a lot. Records still in the queue are written
+    when the process exits.
+
+    The writer thread does not survive :func:`os.fork`, so in a forked
+    child process, records are written directly instead.
+
+    Args:
+        *handlers: The handlers that write the records.
+
+    """
+
+    def __init__(self, *handlers):
+        """Create new :class:`QueueHandler` and start its writer thread."""
+        logging.Handler.__init__(self)
+        self.handlers = handlers
+        self.queue = Queue.Queue()
+        self._pid = os.getpid()
+        self._thread = Thread(target=self._write)
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.close)
+
+    def prepare(self, record):
+        """Merge message, arguments and traceback into ``record.msg``.
+
+        The arguments may have changed (or may not be picklable) by the
+        time the writer thread gets to the record.
+        """
+        msg = self.format(record)
+        record.message = msg
+        record.msg = msg
+        record.args = None
+        record.exc_info = None
+        record.exc_text = None
+        return record
+
+    def emit(self, record):
+        """Queue ``record`` for the writer thread."""
+        if os.getpid() != self._pid:  # forked, so no writer thread
+            self._handle(record)
+            return
+
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except Exception:  # pragma: no cover
+            self.handleError(record)
+
+    def _write(self):
+        """Pass queued records to :attr:`handlers` until told to stop."""
+        while True:
+            record = self.queue.get()
+            if record is None:
+                break
+
+            self._handle(record)
+
+    def _handle(self, record):
+        """Pass ``record`` to :attr:`handlers`."""
+        for handler in self.handlers:
+            if record.levelno >= handler.level:
+                handler.handle(record)
+
+    def close(self):
+        """Write queued records, then stop the writer thread."""
+        if self._thread.is_alive():
+            self.queue.put(None)
+            self._thread.join()
+
+            for handler in self.handlers:
+                handler.close()
+
+        logging.Handler.close(self)
+
+
+# Functions called in the child process by `fork`
+_after_fork_hooks = []
+
+
+def register_after_fork(func):
+    """Call ``func`` in the child process after every :func:`fork`.
+
+    A stand-in for :func:`os.register_at_fork`, which Python 2 lacks.
+    Use it to reset locks that another thread of the parent may have
+    held when it forked, as that thread doesn't exist in the child.
+
+    Args:
+        func (callable): Called without arguments.
+
+    """
+    if func not in _after_fork_hooks:
+        _after_fork_hooks.append(func)
+
+
+def fork():
+    """Call :func:`os.fork` and run the :func:`register_after_fork` hooks.
+
+    Returns:
+        int: ``0`` in the child, the child's PID in the parent.
+
+    """
+    pid = os.fork()
+    if pid == 0:
+        for func in _after_fork_hooks:
+            func()
+    return pid
+
+
+def _reset_logging_locks():
+    """Replace the locks of :mod:`logging` and of all log handlers.
+
+    E.g. a :class:`QueueHandler`'s writer thread holds them while it
+    writes a record.
+    """
+    logging._lock = RLock()
+    for ref in logging._handlerList:
+        handler = ref()
+        if handler is not None:
+            handler.createLock()
+
+
+register_after_fork(_reset_logging_locks)
+
+
 class uninterruptible(object):
     """Decorator that postpones SIGTERM until wrapped function returns.
 
@@ -9,7 +9,10 @@
 
 """Lightweight HTTP library with a requests-like interface."""
 
+import Queue
 import codecs
+import hashlib
+import httplib
 import json
 import mimetypes
 import os
@@ -17,15 +20,38 @@ import random
 import re
 import socket
 import string
+import threading
+import time
 import unicodedata
 import urllib
 import urllib2
 import urlparse
 import zlib
+from cStringIO import StringIO
 
 
 USER_AGENT = u'Alfred-Workflow/1.19 (+http://www.deanishe.net/alfred-workflow)'
 
+#: Number of bytes :meth:`Response.save_to_path` reads at a time
+SAVE_CHUNK_SIZE = 65536
+
+#: Default maximum number of idle connections a :class:`Session` keeps
+#: open to each host
+POOL_SIZE = 4
+
+#: Response headers that describe the connection, not the response, so
+#: an :class:`HTTPCache` doesn't store them
+HOP_BY_HOP_HEADERS = ('connection', 'keep-alive', 'proxy-authenticate',
+                      'proxy-authorization', 'te', 'trailers',
+                      'transfer-encoding', 'upgrade')
+
+#: Default maximum total size in bytes of an :class:`HTTPCache`
+HTTP_CACHE_MAX_BYTES = 10 * 1024 * 1024
+
+#: Default maximum number of files in an :class:`HTTPCache`. Each
+#: response takes two or three files
+HTTP_CACHE_MAX_ENTRIES = 300
+
 # Valid characters for multipart form data boundaries
 BOUNDARY_CHARS = string.digits + string.ascii_letters
 
@@ -103,6 +129,485 @@ class NoRedirectHandler(urllib2.HTTPRedirectHandler):
         return None
 
 
+class ConnectionPool(object):
+    """Idle keep-alive connections, by scheme and host.
+
+    Thread-safe. Used by :class:`Session` to reuse connections.
+
+    :param maxsize: maximum number of idle connections to keep per host
+    :type maxsize: int
+
+    """
+
+    def __init__(self, maxsize=POOL_SIZE):
+        """Create new, empty pool."""
+        self.maxsize = maxsize
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return an idle connection for ``key`` or ``None``."""
+        with self._lock:
+            conns = self._idle.get(key)
+            if conns:
+                return conns.pop()
+
+    def put(self, key, conn):
+        """Keep ``conn`` for reuse or close it if the pool is full."""
+        with self._lock:
+            conns = self._idle.setdefault(key, [])
+            if len(conns) < self.maxsize:
+                conns.append(conn)
+                return
+
+        conn.close()
+
+    def close(self):
+        """Close all idle connections."""
+        with self._lock:
+            idle, self._idle = self._idle, {}
+
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+
+class PooledResponse(object):
+    """File-like body of a response on a pooled connection.
+
+    Hands the connection back to the pool once the body has been read
+    to the end, or closes it if the body is closed before that.
+    """
+
+    def __init__(self, response, release):
+        self._response = response
+        self._release = release
+
+    def _done(self, keep):
+        if self._release is not None:
+            self._release(keep and not self._response.will_close)
+            self._release = None
+
+    def read(self, amt=None):
+        data = self._response.read(amt)
+        if self._response.isclosed():
+            self._done(True)
+        return data
+
+    # For `socket._fileobject`
+    recv = read
+
+    def close(self):
+        self._done(self._response.isclosed())
+        self._response.close()
+
+
+def drain(response):
+    """Read the rest of ``response``'s body and close it.
+
+    A pooled connection only goes back to its pool once the body of its
+    response has been read to the end, so responses that are discarded
+    must be drained.
+
+    :param response: :func:`urllib2.urlopen` response or
+        :class:`urllib2.HTTPError`
+    """
+    while response.read(SAVE_CHUNK_SIZE):
+        pass
+    response.close()
+
+
+class PooledHandlerMixin(object):
+    """Open HTTP(S) connections from a :class:`ConnectionPool`.
+
+    Mix into :class:`urllib2.HTTPHandler` or
+    :class:`urllib2.HTTPSHandler`. Unlike theirs, requests don't ask the
+    server to close the connection.
+    """
+
+    def do_open(self, http_class, req, **http_conn_args):
+        if req._tunnel_host:  # proxy CONNECT: don't pool
+            return urllib2.AbstractHTTPHandler.do_open(
+                self, http_class, req, **http_conn_args)
+
+        host = req.get_host()
+        if not host:
+            raise urllib2.URLError('no host given')
+
+        key = (req.get_type(), host)
+        headers = dict(req.unredirected_hdrs)
+        headers.update((k, v) for k, v in req.headers.items()
+                       if k not in headers)
+        headers = dict((name.title(), val) for name, val in headers.items())
+
+        conn = self.pool.get(key)
+        while True:
+            reused = conn is not None
+            if not reused:
+                conn = http_class(host, timeout=req.timeout, **http_conn_args)
+            else:
+                conn.timeout = req.timeout
+                if conn.sock is not None:
+                    conn.sock.settimeout(req.timeout)
+
+            try:
+                conn.request(req.get_method(), req.get_selector(), req.data,
+                             headers)
+                r = conn.getresponse(buffering=True)
+            except (socket.error, httplib.HTTPException) as err:
+                conn.close()
+                # The server may have closed the idle connection
+                if reused and not isinstance(err, socket.timeout):
+                    conn = None
+                    continue
+                if isinstance(err, socket.error):
+                    raise urllib2.URLError(err)
+                raise
+            break
+
+        def release(keep):
+            if keep:
+                self.pool.put(key, conn)
+            else:
+                conn.close()
+
+        fp = socket._fileobject(PooledResponse(r, release), close=True)
+        resp = urllib2.addinfourl(fp, r.msg, req.get_full_url())
+        resp.code = r.status
+        resp.msg = r.reason
+        return resp
+
+
+class PooledHTTPHandler(PooledHandlerMixin, urllib2.HTTPHandler):
+    """:class:`urllib2.HTTPHandler` that reuses connections in ``pool``."""
+
+    def __init__(self, pool):
+        urllib2.HTTPHandler.__init__(self)
+        self.pool = pool
+
+
+class PooledHTTPSHandler(PooledHandlerMixin, urllib2.HTTPSHandler):
+    """:class:`urllib2.HTTPSHandler` that reuses connections in ``pool``."""
+
+    def __init__(self, pool):
+        urllib2.HTTPSHandler.__init__(self)
+        self.pool = pool
+
+
+def parse_cache_control(value):
+    """Parse a ``Cache-Control`` header into a :class:`dict`.
+
+    :param value: value of the header
+    :type value: str
+    :returns: directives mapped to their values (``None`` if they
+        have none)
+    :rtype: dict
+
+    """
+    directives = {}
+    for directive in (value or '').split(','):
+        name, _, arg = directive.strip().partition('=')
+        if name:
+            directives[name.lower()] = arg.strip('"') if arg else None
+    return directives
+
+
+class HTTPCache(object):
+    """On-disk cache of responses to GET requests.
+
+    Responses are stored in ``dirpath``, keyed by URL and the values of
+    the request headers named in their ``Vary`` header. A stored
+    response is returned without contacting the server for as long as
+    its ``Cache-Control`` ``max-age`` says it's fresh. After that, it's
+    revalidated with a conditional request using its ``ETag`` and
+    ``Last-Modified`` headers, and if the server answers "304 Not
+    Modified", it's returned again.
+
+    Responses with ``Cache-Control: no-store`` or ``Vary: *`` and ones
+    without a ``max-age`` or a validator aren't stored.
+
+    A :class:`~workflow.cachemanager.CacheManager` keeps the directory
+    within ``max_bytes`` and ``max_entries`` files. It's run after a
+    response is stored and evicts the least recently used files.
+
+    Use it by passing it to a :class:`Session`::
+
+        session = Session(cache=HTTPCache(wf.cachefile('http')))
+
+    :param dirpath: directory to store responses in. It's created if
+        it doesn't exist
+    :type dirpath: unicode
+    :param max_bytes: maximum total size of the stored responses
+    :type max_bytes: int
+    :param max_entries: maximum number of files in ``dirpath``
+    :type max_entries: int
+
+    """
+
+    def __init__(self, dirpath, max_bytes=HTTP_CACHE_MAX_BYTES,
+                 max_entries=HTTP_CACHE_MAX_ENTRIES):
+        """Create new cache in ``dirpath``."""
+        from cachemanager import CacheManager
+
+        self.dirpath = dirpath
+        self.manager = CacheManager(dirpath, max_bytes=max_bytes,
+                                    max_entries=max_entries)
+
+    def _path(self, key, ext):
+        return os.path.join(self.dirpath, key + ext)
+
+    def _tmp_path(self, path):
+        """Return a temporary path to write ``path`` to before renaming
+        it, unique to this thread.
+        """
+        return '{0}.{1}.{2}.tmp'.format(path, os.getpid(),
+                                        threading.current_thread().ident)
+
+    def _write(self, path, data):
+        """Atomically replace the file at ``path`` with ``data``."""
+        tmp = self._tmp_path(path)
+        with open(tmp, 'wb') as fp:
+            fp.write(data)
+        os.rename(tmp, path)
+
+    def _url_key(self, url):
+        return hashlib.sha1(url).hexdigest()
+
+    def _key(self, req, vary):
+        """Return the key of the response to ``req`` for header names
+        ``vary``.
+        """
+        parts = [req.get_full_url()]
+        for name in vary:
+            parts.append('{0}={1}'.format(
+                name.lower(), req.get_header(name.capitalize(), '')))
+        return hashlib.sha1(b'\0'.join(parts)).hexdigest()
+
+    def _vary(self, url):
+        """Return the names of the headers responses to ``url`` vary by."""
+        try:
+            with open(self._path(self._url_key(url), '.vary'), 'rb') as fp:
+                return json.load(fp)
+        except (IOError, ValueError):
+            return []
+
+    def lookup(self, req):
+        """Return the stored response to ``req`` or ``None``.
+
+        :param req: GET request
+        :type req: :class:`urllib2.Request`
+        :returns: response's metadata
+        :rtype: dict
+
+        """
+        key = self._key(req, self._vary(req.get_full_url()))
+        try:
+            with open(self._path(key, '.json'), 'rb') as fp:
+                entry = json.load(fp)
+        except (IOError, ValueError):
+            return None
+
+        if not os.path.exists(self._path(key, '.body')):
+            return None
+
+        return entry
+
+    def is_fresh(self, entry):
+        """Whether the response ``entry`` may be used without revalidating.
+
+        :param entry: as returned by :meth:`lookup`
+        :type entry: dict
+        :rtype: bool
+
+        """
+        if entry['no_cache']:
+            return False
+        return time.time() - entry['stored'] < entry['max_age']
+
+    def _freshness(self, headers):
+        """Return ``(max_age, no_cache)`` from ``headers``."""
+        directives = parse_cache_control(headers.get('cache-control'))
+        try:
+            max_age = int(directives.get('max-age') or 0)
+            max_age -= int(headers.get('age') or 0)
+        except ValueError:
+            max_age = 0
+
+        return max_age, 'no-cache' in directives
+
+    def cacheable(self, response):
+        """Whether ``response`` may be stored.
+
+        :param response: response to a GET request
+        :type response: :func:`urllib2.urlopen` response
+        :rtype: bool
+
+        """
+        headers = response.info()
+        if response.code != 200 or headers.get('vary', '').strip() == '*':
+            return False
+
+        if 'no-store' in parse_cache_control(headers.get('cache-control')):
+            return False
+
+        max_age, _ = self._freshness(headers)
+        return bool(max_age > 0 or headers.get('etag') or
+                    headers.get('last-modified'))
+
+    def store(self, req, response):
+        """Store ``response`` to ``req``. Reads its body.
+
+        :param req: GET request
+        :type req: :class:`urllib2.Request`
+        :param response: cacheable response to ``req``
+        :type response: :func:`urllib2.urlopen` response
+        :returns: stored response's metadata
+        :rtype: dict
+
+        """
+        if not os.path.exists(self.dirpath):
+            os.makedirs(self.dirpath)
+
+        headers = response.info()
+        vary = [name.strip() for name in headers.get('vary', '').split(',')
+                if name.strip()]
+        key = self._key(req, vary)
+
+        # Stream the body to disk
+        path = self._path(key, '.body')
+        tmp = self._tmp_path(path)
+        with open(tmp, 'wb') as fp:
+            while True:
+                chunk = response.read(65536)
+                if not chunk:
+                    break
+                fp.write(chunk)
+        os.rename(tmp, path)
+        response.close()
+
+        max_age, no_cache = self._freshness(headers)
+        entry = {
+            'key': key,
+            'url': req.get_full_url(),
+            'code': response.code,
+            'reason': response.msg,
+            'headers': [(name, value) for name, value in headers.items()
+                        if name.lower() not in HOP_BY_HOP_HEADERS],
+            'stored': time.time(),
+            'max_age': max_age,
+            'no_cache': no_cache,
+        }
+        self._write(self._path(key, '.json'), json.dumps(entry))
+        self._write(self._path(self._url_key(req.get_full_url()), '.vary'),
+                    json.dumps(vary))
+
+        self.manager.run()
+        return entry
+
+    def refresh(self, entry, response):
+        """Update ``entry`` from a "304 Not Modified" ``response``.
+
+        :param entry: as returned by :meth:`lookup`
+        :type entry: dict
+        :param response: response to the conditional request
+        :type response: :func:`urllib2.urlopen` response
+        :returns: updated metadata
+        :rtype: dict
+
+        """
+        drain(response)
+
+        headers = CaseInsensitiveDictionary(entry['headers'])
+        for name, value in response.info().items():
+            if name.lower() not in HOP_BY_HOP_HEADERS + ('content-length',):
+                headers[name] = value
+
+        entry['headers'] = headers.items()
+        entry['stored'] = time.time()
+        entry['max_age'], entry['no_cache'] = self._freshness(headers)
+        self._write(self._path(entry['key'], '.json'), json.dumps(entry))
+        return entry
+
+    def response(self, entry):
+        """Return a :func:`urllib2.urlopen`-like response for ``entry``.
+
+        :param entry: as returned by :meth:`lookup`
+        :type entry: dict
+        :returns: response that reads the stored body
+        :rtype: :class:`urllib2.addinfourl`
+
+        """
+        header_text = ''.join('{0}: {1}\r\n'.format(name, value)
+                              for name, value in entry['headers'])
+        headers = httplib.HTTPMessage(StringIO(header_text))
+        resp = urllib2.addinfourl(open(self._path(entry['key'], '.body'),
+                                       'rb'),
+                                  headers, entry['url'])
+        resp.code = entry['code']
+        resp.msg = entry['reason']
+        resp.from_cache = True
+        return resp
+
+    def clear(self):
+        """Delete all stored responses."""
+        if not os.path.exists(self.dirpath):
+            return
+
+        for filename in os.listdir(self.dirpath):
+            os.unlink(os.path.join(self.dirpath, filename))
+
+
+class HTTPCacheHandler(urllib2.BaseHandler):
+    """Answer GET requests from an :class:`HTTPCache` where possible.
+
+    Runs before :class:`urllib2.HTTPErrorProcessor`, so it sees "304 Not
+    Modified" responses before they're turned into errors.
+    """
+
+    handler_order = 400
+
+    def __init__(self, cache):
+        self.cache = cache
+
+    def default_open(self, req):
+        """Return fresh stored response or make ``req`` conditional."""
+        if req.get_method() != 'GET':
+            return None
+
+        entry = self.cache.lookup(req)
+        if entry is None:
+            return None
+
+        if self.cache.is_fresh(entry):
+            return self.cache.response(entry)
+
+        req.cache_entry = entry
+        headers = CaseInsensitiveDictionary(entry['headers'])
+        if headers.get('etag'):
+            req.add_unredirected_header('If-None-match', headers['etag'])
+        if headers.get('last-modified'):
+            req.add_unredirected_header('If-modified-since',
+                                        headers['last-modified'])
+        return None
+
+    def http_response(self, req, response):
+        """Store cacheable responses and resolve "304 Not Modified"."""
+        if req.get_method() != 'GET' or getattr(response, 'from_cache', False):
+            return response
+
+        entry = getattr(req, 'cache_entry', None)
+        if response.code == 304 and entry is not None:
+            # `refresh` drains the 304, releasing its connection
+            return self.cache.response(self.cache.refresh(entry, response))
+
+        if self.cache.cacheable(response):
+            return self.cache.response(self.cache.store(req, response))
+
+        return response
+
+    https_response = http_response
+
+
 # Adapted from https://gist.github.com/babakness/3901174
 class CaseInsensitiveDictionary(dict):
     """Dictionary with caseless key search.
@@ -188,12 +693,18 @@ class Response(object):
 
     """
 
-    def __init__(self, request, stream=False):
+    def __init__(self, request, stream=False, opener=None, timeout=None):
         """Call `request` with :mod:`urllib2` and process results.
 
         :param request: :class:`urllib2.Request` instance
         :param stream: Whether to stream response or retrieve it all at once
         :type stream: bool
+        :param opener: Opener to open ``request`` with. Default is the
+            one installed with :func:`urllib2.install_opener`
+        :type opener: :class:`urllib2.OpenerDirector`
+        :param timeout: Socket timeout in seconds. Default is the global
+            default timeout
+        :type timeout: int
 
         """
         self.request = request
@@ -209,10 +720,23 @@ class Response(object):
         self._content_loaded = False
         self._gzipped = False
 
+        if timeout is None:
+            timeout = socket._GLOBAL_DEFAULT_TIMEOUT
+
         # Execute query
         try:
-            self.raw = urllib2.urlopen(request)
+            if opener is None:
+                self.raw = urllib2.urlopen(request, timeout=timeout)
+            else:
+                self.raw = opener.open(request, timeout=timeout)
         except urllib2.HTTPError as err:
+            if err.fp is not None:
+                # Read the error's body now, so its connection is
+                # released even if nobody reads it, and keep it readable
+                body = err.read()
+                err.close()
+                err.__init__(err.filename, err.code, err.msg, err.hdrs,
+                             StringIO(body))
             self.error = err
             try:
                 self.url = err.geturl()
@@ -292,18 +816,42 @@ class Response(object):
 
         """
         if not self._content:
+            self._content = b''.join(self._iter_body(SAVE_CHUNK_SIZE))
+            self._content_loaded = True
 
-            # Decompress gzipped content
-            if self._gzipped:
-                decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
-                self._content = decoder.decompress(self.raw.read())
+        return self._content
 
-            else:
-                self._content = self.raw.read()
+    def _iter_body(self, chunk_size):
+        """Iterate over the body, decompressing it if it's gzipped.
 
-            self._content_loaded = True
+        No chunk is bigger than ``chunk_size`` bytes, however much a
+        compressed chunk expands, so memory use is constant.
 
-        return self._content
+        """
+        def read():
+            while True:
+                chunk = self.raw.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+        if not self._gzipped:
+            return read()
+
+        def gunzip(chunks):
+            decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            for chunk in chunks:
+                data = decoder.decompress(chunk, chunk_size)
+                while data:
+                    yield data
+                    data = decoder.decompress(decoder.unconsumed_tail,
+                                              chunk_size)
+
+            data = decoder.flush()
+            if data:
+                yield data
+
+        return gunzip(read())
 
     @property
     def text(self):
@@ -326,6 +874,8 @@ class Response(object):
 
         .. versionadded:: 1.6
 
+        Gzipped responses are decompressed as they are read.
+
         :param chunk_size: Number of bytes to read into memory
         :type chunk_size: int
         :param decode_unicode: Decode to Unicode using detected encoding
@@ -355,22 +905,7 @@ class Response(object):
             if data:  # pragma: no cover
                 yield data
 
-        def generate():
-
-            if self._gzipped:
-                decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
-
-            while True:
-                chunk = self.raw.read(chunk_size)
-                if not chunk:
-                    break
-
-                if self._gzipped:
-                    chunk = decoder.decompress(chunk)
-
-                yield chunk
-
-        chunks = generate()
+        chunks = self._iter_body(chunk_size)
 
         if decode_unicode and self.encoding:
             chunks = decode_stream(chunks, self)
@@ -393,7 +928,7 @@ class Response(object):
         self.stream = True
 
         with open(filepath, 'wb') as fileobj:
-            for data in self.iter_content():
+            for data in self.iter_content(SAVE_CHUNK_SIZE):
                 fileobj.write(data)
 
     def raise_for_status(self):
@@ -455,12 +990,271 @@ class Response(object):
         return encoding
 
 
+class Session(object):
+    """Make HTTP(S) requests that share connections and default headers.
+
+    Connections are kept open after a response has been read and reused
+    for the next request to the same host, which saves a TCP (and TLS)
+    handshake per request. Sessions are thread-safe.
+
+    >>> s = Session(headers={'Accept': 'application/json'})
+    >>> r = s.get('https://api.github.com/repos/deanishe/alfred-workflow')
+    >>> r = s.get('https://api.github.com/repos/deanishe/alfred-workflow'
+    ...           '/releases', timeout=10)  # reuses the connection
+
+    Only responses that have been read to the end release their
+    connection to the pool.
+
+    :param headers: HTTP headers sent with every request. Headers passed
+        to :meth:`request` override them
+    :type headers: dict
+    :param timeout: default socket timeout in seconds
+    :type timeout: int
+    :param pool_size: maximum number of idle connections to keep per host
+    :type pool_size: int
+    :param cache: cache for responses to GET requests. Default is not
+        to cache responses
+    :type cache: :class:`HTTPCache`
+
+    """
+
+    def __init__(self, headers=None, timeout=60, pool_size=POOL_SIZE,
+                 cache=None):
+        """Create new :class:`Session`."""
+        self.headers = CaseInsensitiveDictionary(headers)
+        self.timeout = timeout
+        self.pool = ConnectionPool(pool_size)
+        self.cache = cache
+        self._openers = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the session's idle connections."""
+        self.pool.close()
+
+    def _opener(self, url, auth, allow_redirects):
+        """Return an opener using the session's connections."""
+        if auth is None:  # cacheable
+            opener = self._openers.get(allow_redirects)
+            if opener is not None:
+                return opener
+
+        handlers = [PooledHTTPHandler(self.pool),
+                    PooledHTTPSHandler(self.pool)]
+
+        if self.cache is not None:
+            handlers.append(HTTPCacheHandler(self.cache))
+
+        if not allow_redirects:
+            handlers.append(NoRedirectHandler())
+
+        if auth is not None:  # Add authorisation handler
+            username, password = auth
+            password_manager = urllib2.HTTPPasswordMgrWithDefaultRealm()
+            password_manager.add_password(None, url, username, password)
+            auth_manager = urllib2.HTTPBasicAuthHandler(password_manager)
+            handlers.append(auth_manager)
+
+        opener = urllib2.build_opener(*handlers)
+        if auth is None:
+            self._openers[allow_redirects] = opener
+
+        return opener
+
+    def request(self, method, url, params=None, data=None, headers=None,
+                cookies=None, files=None, auth=None, timeout=None,
+                allow_redirects=False, stream=False):
+        """Initiate an HTTP(S) request. Returns :class:`Response` object.
+
+        Arguments as for :func:`request`. ``timeout`` defaults to the
+        session's :attr:`timeout`.
+
+        """
+        # TODO: cookies
+        if timeout is None:
+            timeout = self.timeout
+
+        opener = self._opener(url, auth, allow_redirects)
+
+        merged = CaseInsensitiveDictionary(self.headers)
+        merged.update(CaseInsensitiveDictionary(headers))
+        headers = merged
+
+        if 'user-agent' not in headers:
+            headers['user-agent'] = USER_AGENT
+
+        # Accept gzip-encoded content
+        encodings = [s.strip() for s in
+                     headers.get('accept-encoding', '').split(',')]
+        if 'gzip' not in encodings:
+            encodings.append('gzip')
+
+        headers['accept-encoding'] = ', '.join(encodings)
+
+        # Force POST by providing an empty data string
+        if method == 'POST' and not data:
+            data = ''
+
+        if files:
+            if not data:
+                data = {}
+            new_headers, data = encode_multipart_formdata(data, files)
+            headers.update(new_headers)
+        elif data and isinstance(data, dict):
+            data = urllib.urlencode(str_dict(data))
+
+        # Make sure everything is encoded text
+        headers = str_dict(headers)
+
+        if isinstance(url, unicode):
+            url = url.encode('utf-8')
+
+        if params:  # GET args (POST args are handled in encode_multipart_formdata)
+
+            scheme, netloc, path, query, fragment = urlparse.urlsplit(url)
+
+            if query:  # Combine query string and `params`
+                url_params = urlparse.parse_qs(query)
+                # `params` take precedence over URL query string
+                url_params.update(params)
+                params = url_params
+
+            query = urllib.urlencode(str_dict(params), doseq=True)
+            url = urlparse.urlunsplit((scheme, netloc, path, query, fragment))
+
+        req = urllib2.Request(url, data, headers)
+        if method not in ('GET', 'POST'):  # urllib2 only knows these two
+            req.get_method = lambda: method
+
+        return Response(req, stream, opener, timeout)
+
+    def get(self, url, params=None, headers=None, cookies=None, auth=None,
+            timeout=None, allow_redirects=True, stream=False):
+        """Initiate a GET request. Arguments as for :func:`request`.
+
+        :returns: :class:`Response` instance
+
+        """
+        return self.request('GET', url, params, headers=headers,
+                            cookies=cookies, auth=auth, timeout=timeout,
+                            allow_redirects=allow_redirects, stream=stream)
+
+    def post(self, url, params=None, data=None, headers=None, cookies=None,
+             files=None, auth=None, timeout=None, allow_redirects=False,
+             stream=False):
+        """Initiate a POST request. Arguments as for :func:`request`.
+
+        :returns: :class:`Response` instance
+
+        """
+        return self.request('POST', url, params, data, headers, cookies,
+                            files, auth, timeout, allow_redirects, stream)
+
+    def get_many(self, requests, max_workers=POOL_SIZE):
+        """Make several requests at once. Returns responses in order.
+
+        Each request is a URL to GET or a :class:`dict` of keyword
+        arguments to :meth:`request`, whose ``method`` defaults to
+        ``GET``. Up to ``max_workers`` requests are made at the same
+        time in threads, which share the session's connections.
+
+        Unless a request is streamed, its body is read in its thread, so
+        :attr:`Response.content` doesn't block.
+
+        >>> responses = s.get_many(['https://example.com/a',
+        ...                         {'url': 'https://example.com/b',
+        ...                          'params': {'page': 2}}])
+
+        :param requests: URLs or request arguments
+        :type requests: iterable
+        :param max_workers: maximum number of concurrent requests
+        :type max_workers: int
+        :returns: a :class:`Response` for each request or the exception
+            that was raised while making it, e.g.
+            :class:`urllib2.URLError` if the server couldn't be reached
+        :rtype: list
+
+        """
+        requests = list(requests)
+        results = [None] * len(requests)
+        queue = Queue.Queue()
+        for item in enumerate(requests):
+            queue.put(item)
+
+        def work():
+            while True:
+                try:
+                    index, req = queue.get_nowait()
+                except Queue.Empty:
+                    return
+                results[index] = self._fetch(req)
+
+        threads = [threading.Thread(target=work)
+                   for _ in range(min(max_workers, len(requests)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return results
+
+    def _fetch(self, req):
+        """Make request ``req`` for :meth:`get_many`.
+
+        Returns the response or the exception raised.
+        """
+        if isinstance(req, basestring):
+            kwargs = {'url': req}
+        else:
+            kwargs = dict(req)
+
+        method = kwargs.pop('method', 'GET')
+        if method == 'GET':  # as `get`
+            kwargs.setdefault('allow_redirects', True)
+
+        try:
+            response = self.request(method, **kwargs)
+            if not response.stream and response.error is None:
+                response.content
+        except Exception as err:
+            return err
+
+        return response
+
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def default_session():
+    """Return the :class:`Session` used by :func:`request` etc.
+
+    :returns: Session shared by the module-level functions
+    :rtype: :class:`Session`
+
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = Session()
+        return _session
+
+
 def request(method, url, params=None, data=None, headers=None, cookies=None,
             files=None, auth=None, timeout=60, allow_redirects=False,
             stream=False):
     """Initiate an HTTP(S) request. Returns :class:`Response` object.
 
-    :param method: 'GET' or 'POST'
+    The request is made with the :func:`default_session`, so it reuses
+    connections opened by earlier requests to the same host.
+
+    :param method: HTTP method, e.g. 'GET' or 'POST'
     :type method: unicode
     :param url: URL to open
     :type url: unicode
@@ -500,75 +1294,9 @@ def request(method, url, params=None, data=None, headers=None, cookies=None,
       will be used.
 
     """
-    # TODO: cookies
-    socket.setdefaulttimeout(timeout)
-
-    # Default handlers
-    openers = []
-
-    if not allow_redirects:
-        openers.append(NoRedirectHandler())
-
-    if auth is not None:  # Add authorisation handler
-        username, password = auth
-        password_manager = urllib2.HTTPPasswordMgrWithDefaultRealm()
-        password_manager.add_password(None, url, username, password)
-        auth_manager = urllib2.HTTPBasicAuthHandler(password_manager)
-        openers.append(auth_manager)
-
-    # Install our custom chain of openers
-    opener = urllib2.build_opener(*openers)
-    urllib2.install_opener(opener)
-
-    if not headers:
-        headers = CaseInsensitiveDictionary()
-    else:
-        headers = CaseInsensitiveDictionary(headers)
-
-    if 'user-agent' not in headers:
-        headers['user-agent'] = USER_AGENT
-
-    # Accept gzip-encoded content
-    encodings = [s.strip() for s in
-                 headers.get('accept-encoding', '').split(',')]
-    if 'gzip' not in encodings:
-        encodings.append('gzip')
-
-    headers['accept-encoding'] = ', '.join(encodings)
-
-    # Force POST by providing an empty data string
-    if method == 'POST' and not data:
-        data = ''
-
-    if files:
-        if not data:
-            data = {}
-        new_headers, data = encode_multipart_formdata(data, files)
-        headers.update(new_headers)
-    elif data and isinstance(data, dict):
-        data = urllib.urlencode(str_dict(data))
-
-    # Make sure everything is encoded text
-    headers = str_dict(headers)
-
-    if isinstance(url, unicode):
-        url = url.encode('utf-8')
-
-    if params:  # GET args (POST args are handled in encode_multipart_formdata)
-
-        scheme, netloc, path, query, fragment = urlparse.urlsplit(url)
-
-        if query:  # Combine query string and `params`
-            url_params = urlparse.parse_qs(query)
-            # `params` take precedence over URL query string
-            url_params.update(params)
-            params = url_params
-
-        query = urllib.urlencode(str_dict(params), doseq=True)
-        url = urlparse.urlunsplit((scheme, netloc, path, query, fragment))
-
-    req = urllib2.Request(url, data, headers)
-    return Response(req, stream)
+    return default_session().request(method, url, params, data, headers,
+                                     cookies, files, auth, timeout,
+                                     allow_redirects, stream)
 
 
 def get(url, params=None, headers=None, cookies=None, auth=None,
@@ -594,6 +1322,18 @@ def post(url, params=None, data=None, headers=None, cookies=None, files=None,
                    timeout, allow_redirects, stream)
 
 
+def get_many(requests, max_workers=POOL_SIZE):
+    """Make several requests at once with the :func:`default_session`.
+
+    See :meth:`Session.get_many`.
+
+    :returns: :class:`Response` instances or exceptions, in order
+    :rtype: list
+
+    """
+    return default_session().get_many(requests, max_workers)
+
+
 def encode_multipart_formdata(fields, files):
     """Encode form data (``fields``) and ``files`` for POST request.
 
@@ -23,10 +23,13 @@ from __future__ import print_function, unicode_literals
 
 import binascii
 import cPickle
-from copy import deepcopy
+from contextlib import contextmanager
+from cStringIO import StringIO
+import hashlib
 import json
 import logging
 import logging.handlers
+import marshal
 import os
 import pickle
 import plistlib
@@ -35,8 +38,10 @@ import shutil
 import string
 import subprocess
 import sys
+import tempfile
 import time
 import unicodedata
+import zlib
 
 try:
     import xml.etree.cElementTree as ET
@@ -47,6 +52,7 @@ from util import (
     AcquisitionError,  # imported to maintain API
     atomic_writer,
     LockFile,
+    QueueHandler,
     uninterruptible,
 )
 
@@ -54,6 +60,12 @@ from util import (
 #: correctly have the value ``None``)
 UNSET = object()
 
+# Objects loaded by `Workflow._load_file` and the (mtime, size, inode)
+# of their files, keyed by path. Shared by all `Workflow` instances in
+# the process
+_loaded_files = {}
+
+
 ####################################################################
 # Standard system icons
 ####################################################################
@@ -443,6 +455,14 @@ MATCH_ALL = 127
 # Number of days to wait between checking for updates to the workflow
 DEFAULT_UPDATE_FREQUENCY = 1
 
+####################################################################
+# Used by `Workflow._info_fields`
+####################################################################
+
+# The ``info.plist`` keys this library reads. They are cached in a
+# small JSON file, so ``info.plist`` needn't be parsed on every run
+INFO_PLIST_FIELDS = ('bundleid', 'name', 'version')
+
 
 ####################################################################
 # Keychain access errors
@@ -698,11 +718,93 @@ class PickleSerializer(object):
         return pickle.dump(obj, file_obj, protocol=-1)
 
 
+class MarshalSerializer(object):
+    """Wrapper around :mod:`marshal`. Sets ``version``.
+
+    The fastest of the built-in serializers, but it only supports
+    built-in types (``dict``, ``list``, ``unicode``, ``int`` etc.) and
+    its format may change between Python versions, so only use it for
+    caches that can be regenerated.
+
+    """
+
+    @classmethod
+    def load(cls, file_obj):
+        """Load serialized object from open marshal file.
+
+        :param file_obj: file handle
+        :type file_obj: ``file`` object
+        :returns: object loaded from marshal file
+        :rtype: object
+
+        """
+        return marshal.loads(file_obj.read())
+
+    @classmethod
+    def dump(cls, obj, file_obj):
+        """Serialize object ``obj`` to open marshal file.
+
+        :param obj: Python object to serialize
+        :type obj: built-in types only
+        :param file_obj: file handle
+        :type file_obj: ``file`` object
+
+        """
+        return file_obj.write(marshal.dumps(obj, 2))
+
+
+class ZlibSerializer(object):
+    """Compresses the output of another serializer with :mod:`zlib`.
+
+    Trades CPU time for smaller files. Register an instance, e.g.::
+
+        manager.register('cpickle.zlib', ZlibSerializer(CPickleSerializer))
+
+    :param serializer: serializer to compress the output of
+    :param level: :mod:`zlib` compression level (1-9)
+    :type level: ``int``
+
+    """
+
+    def __init__(self, serializer, level=6):
+        """Create new ZlibSerializer for ``serializer``."""
+        self.serializer = serializer
+        self.level = level
+
+    def load(self, file_obj):
+        """Load serialized object from open compressed file.
+
+        :param file_obj: file handle
+        :type file_obj: ``file`` object
+        :returns: object loaded from compressed file
+        :rtype: object
+
+        """
+        data = zlib.decompress(file_obj.read())
+        return self.serializer.load(StringIO(data))
+
+    def dump(self, obj, file_obj):
+        """Serialize and compress object ``obj`` to open file.
+
+        :param obj: Python object to serialize
+        :type obj: anything the wrapped serializer supports
+        :param file_obj: file handle
+        :type file_obj: ``file`` object
+
+        """
+        buf = StringIO()
+        self.serializer.dump(obj, buf)
+        return file_obj.write(zlib.compress(buf.getvalue(), self.level))
+
+
 # Set up default manager and register built-in serializers
 manager = SerializerManager()
 manager.register('cpickle', CPickleSerializer)
 manager.register('pickle', PickleSerializer)
 manager.register('json', JSONSerializer)
+manager.register('marshal', MarshalSerializer)
+manager.register('cpickle.zlib', ZlibSerializer(CPickleSerializer))
+manager.register('marshal.zlib', ZlibSerializer(MarshalSerializer))
 
 
 class Item(object):
@@ -821,27 +923,102 @@ class Settings(dict):
         super(Settings, self).__init__()
         self._filepath = filepath
         self._nosave = False
-        self._original = {}
+        # Depth of nested `batch()` blocks and whether they changed anything
+        self._batch = 0
+        self._dirty = False
+        # JSON the settings were last loaded from or saved as, the
+        # settings decoded from it (only when needed) and the (mtime,
+        # size) of the file at the time
+        self._saved = b'{}'
+        self._original = None
+        self._signature = None
         if os.path.exists(self._filepath):
             self._load()
         elif defaults:
-            for key, val in defaults.items():
-                self[key] = val
-            self.save()  # save default settings
+            with self.batch():  # save default settings
+                for key, val in defaults.items():
+                    self[key] = val
 
     def _load(self):
         """Load cached settings from JSON file `self._filepath`."""
-        data = {}
-        with LockFile(self._filepath, 0.5):
+        # No timeout, so waiting for a writer happens in the kernel and
+        # ends as soon as the (short) write is done
+        with LockFile(self._filepath, shared=True):
             with open(self._filepath, 'rb') as fp:
-                data.update(json.load(fp))
+                raw = fp.read()
+                st = os.fstat(fp.fileno())
 
-        self._original = deepcopy(data)
+        self._saved = raw
+        self._original = None
+        self._signature = (st.st_mtime, st.st_size)
 
         self._nosave = True
-        self.update(data)
+        super(Settings, self).clear()
+        self.update(json.loads(raw))
         self._nosave = False
 
+    def _file_signature(self):
+        """Return ``(mtime, size)`` of the settings file or ``None``."""
+        try:
+            st = os.stat(self._filepath)
+        except OSError:
+            return None
+        return (st.st_mtime, st.st_size)
+
+    def reload(self):
+        """Reload settings if the file was changed by another process.
+
+        Costs a single :func:`os.stat` call if the file hasn't changed.
+        Does nothing during a :meth:`batch`.
+
+        :returns: ``True`` if settings were reloaded, else ``False``
+
+        """
+        if self._batch or self._file_signature() == self._signature:
+            return False
+
+        if os.path.exists(self._filepath):
+            self._load()
+        else:  # deleted
+            super(Settings, self).clear()
+            self._saved = b'{}'
+            self._original = None
+            self._signature = None
+
+        return True
+
+    @contextmanager
+    def batch(self):
+        """Save all changes made in a ``with`` block in one write.
+
+        >>> with wf.settings.batch():
+        >>>     wf.settings['key1'] = 'value1'
+        >>>     wf.settings['key2'] = 'value2'
+
+        Blocks may be nested; the outermost one saves. If the block
+        raises an exception, the changes made in the outermost block are
+        discarded and the settings are restored to what they were when
+        it started.
+
+        """
+        if not self._batch:
+            snapshot = dict(self)
+
+        self._batch += 1
+        try:
+            yield self
+        except Exception:
+            self._batch -= 1
+            if not self._batch:
+                super(Settings, self).clear()
+                super(Settings, self).update(snapshot)
+                self._dirty = False
+            raise
+        else:
+            self._batch -= 1
+            if not self._batch and self._dirty:
+                self.save()
+
     @uninterruptible
     def save(self):
         """Save settings to JSON file specified in ``self._filepath``.
@@ -849,23 +1026,43 @@ class Settings(dict):
         If you're using this class via :attr:`Workflow.settings`, which
         you probably are, ``self._filepath`` will be ``settings.json``
         in your workflow's data directory (see :attr:`~Workflow.datadir`).
+        Inside a :meth:`batch`, saving is deferred until the end of it.
         """
         if self._nosave:
             return
 
+        if self._batch:
+            self._dirty = True
+            return
+
         data = {}
         data.update(self)
+        raw = json.dumps(data, sort_keys=True, indent=2, encoding='utf-8')
 
-        with LockFile(self._filepath, 0.5):
+        with LockFile(self._filepath):
             with atomic_writer(self._filepath, 'wb') as fp:
-                json.dump(data, fp, sort_keys=True, indent=2,
-                          encoding='utf-8')
+                fp.write(raw)
+            self._signature = self._file_signature()
+
+        self._saved = raw
+        self._original = None
+        self._dirty = False
+
+    def _saved_value(self, key):
+        """Return saved value of ``key`` or `UNSET`.
+
+        Saved values are decoded from the JSON on demand, not copied
+        every time the settings are loaded.
+        """
+        if self._original is None:
+            self._original = json.loads(self._saved)
+        return self._original.get(key, UNSET)
 
     # dict methods
     def __setitem__(self, key, value):
         """Implement :class:`dict` interface."""
-        if self._original.get(key) != value:
-            super(Settings, self).__setitem__(key, value)
+        super(Settings, self).__setitem__(key, value)
+        if self._saved_value(key) != value:
             self.save()
 
     def __delitem__(self, key):
@@ -880,6 +1077,9 @@ class Settings(dict):
 
     def setdefault(self, key, value=None):
         """Override :class:`dict` method to save on update."""
+        if key in self:
+            return self[key]
+
         ret = super(Settings, self).setdefault(key, value)
         self.save()
         return ret
@@ -956,13 +1156,20 @@ class Workflow(object):
         self._data_serializer = 'cpickle'
         self._info = None
         self._info_loaded = False
+        self._info_fields_cache = None
         self._logger = None
+        self._cache_manager = None
         self._items = []
         self._alfred_env = None
         # Version number of the workflow
         self._version = UNSET
         # Version from last workflow run
         self._last_version_run = UNSET
+        # Cached update status and the (mtime, size) of its file
+        self._update_status = None
+        self._update_status_key = None
+        # Names of caches `cached_data` returned stale data for
+        self._stale_caches = set()
         # Cache for regex patterns created for filter keys
         self._search_pattern_cache = {}
         # Magic arguments
@@ -1087,6 +1294,51 @@ class Workflow(object):
             self._load_info_plist()
         return self._info
 
+    @property
+    def _info_fields(self):
+        """:class:`dict` of the ``info.plist`` values used by this library.
+
+        The values (see :const:`INFO_PLIST_FIELDS`) are cached in a JSON
+        file in the temporary directory. The cache is keyed by the
+        modification time and size of ``info.plist``, so the property
+        list is only parsed again after it has changed.
+
+        """
+        if self._info_fields_cache is not None:
+            return self._info_fields_cache
+
+        plist_path = self.workflowfile('info.plist')
+        st = os.stat(plist_path)
+        key = [st.st_mtime, st.st_size]
+
+        cache_path = os.path.join(
+            tempfile.gettempdir(), 'alfred-workflow-info-{0}.json'.format(
+                hashlib.sha1(plist_path.encode('utf-8')).hexdigest()))
+
+        fields = None
+        try:
+            with open(cache_path, 'rb') as file_obj:
+                cached = json.load(file_obj)
+            if cached['key'] == key:
+                fields = cached['fields']
+        except (IOError, ValueError, KeyError, TypeError):
+            pass  # no (valid) cache
+
+        if fields is None:
+            fields = {}
+            for name in INFO_PLIST_FIELDS:
+                fields[name] = self.info.get(name)
+
+            try:
+                with atomic_writer(cache_path, 'wb') as file_obj:
+                    json.dump({'key': key, 'fields': fields}, file_obj)
+            except (IOError, OSError):  # pragma: no cover
+                # Not fatal. Don't log: the logger needs `bundleid`
+                pass
+
+        self._info_fields_cache = fields
+        return fields
+
     @property
     def bundleid(self):
         """Workflow bundle ID from environmental vars or ``info.plist``.
@@ -1099,7 +1351,8 @@ class Workflow(object):
             if self.alfred_env.get('workflow_bundleid'):
                 self._bundleid = self.alfred_env.get('workflow_bundleid')
             else:
-                self._bundleid = unicode(self.info['bundleid'], 'utf-8')
+                self._bundleid = self.decode(
+                    self._info_fields['bundleid'])
 
         return self._bundleid
 
@@ -1130,7 +1383,7 @@ class Workflow(object):
             if self.alfred_env.get('workflow_name'):
                 self._name = self.decode(self.alfred_env.get('workflow_name'))
             else:
-                self._name = self.decode(self.info['name'])
+                self._name = self.decode(self._info_fields['name'])
 
         return self._name
 
@@ -1172,7 +1425,7 @@ class Workflow(object):
 
             # info.plist
             if not version:
-                version = self.info.get('version')
+                version = self._info_fields.get('version')
 
             if version:
                 from update import Version
@@ -1372,6 +1625,26 @@ class Workflow(object):
         """
         return self.cachefile('%s.log' % self.bundleid)
 
+    @property
+    def cache_manager(self):
+        """:class:`~workflow.cachemanager.CacheManager` for the cache directory.
+
+        Background jobs sweep the cache directory with it when they
+        finish. The log file is never evicted. Register other files
+        that must be kept with
+        :func:`~workflow.cachemanager.always_keep`, so background jobs
+        keep them too.
+
+        :rtype: :class:`~workflow.cachemanager.CacheManager`
+
+        """
+        if self._cache_manager is None:
+            from cachemanager import CacheManager
+            self._cache_manager = CacheManager(
+                self.cachedir, keep=[os.path.basename(self.logfile)])
+
+        return self._cache_manager
+
     @property
     def logger(self):
         """Logger that logs to both console and a log file.
@@ -1379,6 +1652,11 @@ class Workflow(object):
         If Alfred's debugger is open, log level will be ``DEBUG``,
         else it will be ``INFO``.
 
+        The log file is only opened when the first message is written.
+        In background jobs started with
+        :func:`~workflow.background.run_in_background`, messages are
+        written by a separate thread.
+
         Use :meth:`open_log` to open the log file in Console.
 
         :returns: an initialised :class:`~logging.Logger`
@@ -1400,16 +1678,24 @@ class Workflow(object):
                 ' %(levelname)-8s %(message)s',
                 datefmt='%H:%M:%S')
 
+            # Don't open the log file until something is logged
             logfile = logging.handlers.RotatingFileHandler(
                 self.logfile,
                 maxBytes=1024 * 1024,
-                backupCount=1)
+                backupCount=1,
+                delay=True)
             logfile.setFormatter(fmt)
-            logger.addHandler(logfile)
 
             console = logging.StreamHandler()
             console.setFormatter(fmt)
-            logger.addHandler(console)
+
+            if os.getenv('_WF_BACKGROUND_JOB'):
+                # Running in the background via `run_in_background`:
+                # write log records from a separate thread
+                logger.addHandler(QueueHandler(logfile, console))
+            else:
+                logger.addHandler(logfile)
+                logger.addHandler(console)
 
         if self.debugging:
             logger.setLevel(logging.DEBUG)
@@ -1458,10 +1744,13 @@ class Workflow(object):
         :rtype: :class:`~workflow.workflow.Settings` instance
 
         """
-        if not self._settings:
+        if self._settings is None:
             self.logger.debug('reading settings from %s', self.settings_path)
             self._settings = Settings(self.settings_path,
                                       self._default_settings)
+        elif self._settings.reload():
+            self.logger.debug('settings changed on disk, reloaded')
+
         return self._settings
 
     @property
@@ -1553,6 +1842,8 @@ class Workflow(object):
         """Retrieve data from data directory.
 
         Returns ``None`` if there are no data stored under ``name``.
+        As with :meth:`cached_data`, loaded data is kept for the rest of
+        the process, so don't modify it in place.
 
         .. versionadded:: 1.8
 
@@ -1588,8 +1879,7 @@ class Workflow(object):
 
             return None
 
-        with open(data_path, 'rb') as file_obj:
-            data = serializer.load(file_obj)
+        data = self._load_file(data_path, serializer)
 
         self.logger.debug('stored data loaded: %s', data_path)
 
@@ -1618,6 +1908,7 @@ class Workflow(object):
         def delete_paths(paths):
             """Clear one or more data stores"""
             for path in paths:
+                _loaded_files.pop(path, None)
                 if os.path.exists(path):
                     os.unlink(path)
                     self.logger.debug('deleted data file: %s', path)
@@ -1658,42 +1949,83 @@ class Workflow(object):
             with atomic_writer(data_path, 'wb') as file_obj:
                 serializer.dump(data, file_obj)
 
+            _loaded_files.pop(data_path, None)
+
         _store()
 
         self.logger.debug('saved data: %s', data_path)
 
-    def cached_data(self, name, data_func=None, max_age=60):
+    def cached_data(self, name, data_func=None, max_age=60, revalidate=None):
         """Return cached data if younger than ``max_age`` seconds.
 
         Retrieve data from cache or re-generate and re-cache data if
         stale/non-existant. If ``max_age`` is 0, return cached data no
         matter how old.
 
+        If ``revalidate`` is set, stale data are returned immediately
+        instead (stale-while-revalidate) and ``revalidate`` is run in
+        the background to regenerate the cache. Only one revalidation
+        job per ``name`` runs at a time; its name is
+        ``__workflow_revalidate_<name>``, so you can check it with
+        :func:`~workflow.background.is_running`. Use
+        :meth:`cached_data_stale` to find out whether the returned data
+        are stale. ``data_func`` is then only called if there are no
+        cached data at all.
+
         :param name: name of datastore
         :param data_func: function to (re-)generate data.
         :type data_func: ``callable``
         :param max_age: maximum age of cached data in seconds
         :type max_age: ``int``
+        :param revalidate: command that regenerates the cache, e.g.
+            ``['/usr/bin/python', 'update.py']``. Passed to
+            :func:`~workflow.background.run_in_background`.
+        :type revalidate: ``list``
         :returns: cached data, return value of ``data_func`` or ``None``
             if ``data_func`` is not set
 
+        ``data_func`` is called while holding a lock on the cache, so if
+        several processes find the cache stale at the same time, only
+        one of them regenerates it and the others get its result.
+
+        Data loaded from the cache is kept for the rest of the process
+        (see :meth:`_load_file`), so don't modify it in place unless
+        you're going to save it again.
+
         """
         serializer = manager.serializer(self.cache_serializer)
 
         cache_path = self.cachefile('%s.%s' % (name, self.cache_serializer))
         age = self.cached_data_age(name)
+        self._stale_caches.discard(name)
 
         if (age < max_age or max_age == 0) and os.path.exists(cache_path):
 
-            with open(cache_path, 'rb') as file_obj:
-                self.logger.debug('loading cached data: %s', cache_path)
-                return serializer.load(file_obj)
+            self.logger.debug('loading cached data: %s', cache_path)
+            return self._load_file(cache_path, serializer)
+
+        if revalidate and (os.path.exists(cache_path) or not data_func):
+            self._revalidate(name, revalidate)
+
+            if os.path.exists(cache_path):
+                self.logger.debug('loading stale cached data: %s',
+                                  cache_path)
+                self._stale_caches.add(name)
+                return self._load_file(cache_path, serializer)
 
         if not data_func:
             return None
 
-        data = data_func()
-        self.cache_data(name, data)
+        # Only one process regenerates the data. The others wait for it
+        # and then use its result
+        with LockFile(cache_path):
+            age = self.cached_data_age(name)
+            if (age < max_age or max_age == 0) and os.path.exists(cache_path):
+                self.logger.debug('loading regenerated data: %s', cache_path)
+                return self._load_file(cache_path, serializer)
+
+            data = data_func()
+            self.cache_data(name, data)
 
         return data
 
@@ -1711,6 +2043,7 @@ class Workflow(object):
         serializer = manager.serializer(self.cache_serializer)
 
         cache_path = self.cachefile('%s.%s' % (name, self.cache_serializer))
+        _loaded_files.pop(cache_path, None)
 
         if data is None:
             if os.path.exists(cache_path):
@@ -1723,6 +2056,42 @@ class Workflow(object):
 
         self.logger.debug('cached data: %s', cache_path)
 
+    def cached_data_stale(self, name):
+        """Whether :meth:`cached_data` last returned stale data for `name`.
+
+        Only stale-while-revalidate calls return stale data.
+
+        :param name: name of datastore
+        :returns: ``True`` if the data are being revalidated, else ``False``
+
+        """
+        return name in self._stale_caches
+
+    def _revalidate(self, name, cmd):
+        """Run ``cmd`` in the background unless it's already running.
+
+        The check and the start happen under a lock, so concurrent
+        runs of the workflow start only one job.
+
+        :param name: name of datastore
+        :param cmd: command to regenerate the datastore
+
+        """
+        from background import is_running, run_in_background
+
+        job = '__workflow_revalidate_' + name
+        lock = LockFile(self.cachefile(job))
+        if not lock.acquire(blocking=False):
+            self.logger.debug('revalidation of `%s` is being started', name)
+            return
+
+        try:
+            if not is_running(job):
+                self.logger.debug('revalidating `%s` ...', name)
+                run_in_background(job, cmd)
+        finally:
+            lock.release()
+
     def cached_data_fresh(self, name, max_age):
         """Whether cache `name` is less than `max_age` seconds old.
 
@@ -2261,10 +2630,7 @@ class Workflow(object):
         :returns: ``True`` if an update is available, else ``False``
 
         """
-        # Create a new workflow object to ensure standard serialiser
-        # is used (update.py is called without the user's settings)
-        update_data = Workflow().cached_data('__workflow_update_status',
-                                             max_age=0)
+        update_data = self._load_update_status()
 
         self.logger.debug('update_data: %r', update_data)
 
@@ -2273,6 +2639,87 @@ class Workflow(object):
 
         return update_data['available']
 
+    def _update_status_age(self):
+        """Return age of the cached update status in seconds.
+
+        Costs a single :func:`os.stat` call.
+
+        :returns: age of the status file or 0 if there is no cached status.
+        :rtype: ``float``
+
+        """
+        try:
+            st = os.stat(self.cachefile('__workflow_update_status.cpickle'))
+        except OSError:
+            return 0
+
+        return time.time() - st.st_mtime
+
+    def _load_update_status(self):
+        """Return contents of the cached update status.
+
+        The status is written by ``update.py`` with the standard
+        serializer, regardless of this workflow's :attr:`cache_serializer`.
+        It costs a single :func:`os.stat` call and the file is only
+        read again if it has changed since the last call.
+
+        :returns: the update status or ``None`` if there is no cached
+            status.
+        :rtype: ``dict``
+
+        """
+        path = self.cachefile('__workflow_update_status.cpickle')
+
+        try:
+            st = os.stat(path)
+        except OSError:
+            self._update_status = None
+            self._update_status_key = None
+            return None
+
+        key = (st.st_mtime, st.st_size)
+        if key != self._update_status_key:
+            with open(path, 'rb') as file_obj:
+                self._update_status = manager.serializer('cpickle').load(
+                    file_obj)
+            self._update_status_key = key
+
+        return self._update_status
+
+    def _load_file(self, path, serializer):
+        """Load ``path`` with ``serializer``, reusing the loaded object.
+
+        The object is kept for the rest of the process and returned again
+        for as long as the file's mtime, size and inode are unchanged, so
+        repeated reads of an unchanged file cost an :func:`os.fstat`
+        call instead of deserialising it again.
+
+        Every caller gets the same object, so callers must not modify it
+        in place: the change would show up in all later loads. Copy the
+        parts you need to change instead (copying the whole object would
+        cost more than loading it again).
+
+        :param path: path to file to load
+        :type path: ``unicode``
+        :param serializer: serializer object to load file with
+        :returns: object loaded from file
+
+        """
+        with open(path, 'rb') as file_obj:
+            st = os.fstat(file_obj.fileno())
+            # The inode changes when the file is atomically replaced,
+            # even if the new file has the same mtime and size
+            key = (st.st_mtime, st.st_size, st.st_ino)
+
+            memo = _loaded_files.get(path)
+            if memo is not None and memo[0] == key:
+                return memo[1]
+
+            data = serializer.load(file_obj)
+
+        _loaded_files[path] = (key, data)
+        return data
+
     @property
     def prereleases(self):
         """Whether workflow should update to pre-release versions.
@@ -2307,36 +2754,38 @@ class Workflow(object):
         frequency = self._update_settings.get('frequency',
                                               DEFAULT_UPDATE_FREQUENCY)
 
-        if not force and not self.settings.get('__workflow_autoupdate', True):
-            self.logger.debug('Auto update turned off by user')
-            return
-
-        # Check for new version if it's time
-        if (force or not self.cached_data_fresh(
-                '__workflow_update_status', frequency * 86400)):
+        if not force:
+            # Check the cheap condition first: it's usually not time to
+            # check yet, and then the settings needn't be consulted
+            age = self._update_status_age()
+            if age and age < frequency * 86400:
+                self.logger.debug('update check not due')
+                return
 
-            github_slug = self._update_settings['github_slug']
-            # version = self._update_settings['version']
-            version = str(self.version)
+            if not self.settings.get('__workflow_autoupdate', True):
+                self.logger.debug('Auto update turned off by user')
+                return
 
-            from background import run_in_background
+        # Time to check for a new version
+        github_slug = self._update_settings['github_slug']
+        # version = self._update_settings['version']
+        version = str(self.version)
 
-            # update.py is adjacent to this file
-            update_script = os.path.join(os.path.dirname(__file__),
-                                         b'update.py')
+        from background import run_in_background
 
-            cmd = ['/usr/bin/python', update_script, 'check', github_slug,
-                   version]
+        # update.py is adjacent to this file
+        update_script = os.path.join(os.path.dirname(__file__),
+                                     b'update.py')
 
-            if self.prereleases:
-                cmd.append('--prereleases')
+        cmd = ['/usr/bin/python', update_script, 'check', github_slug,
+               version]
 
-            self.logger.info('checking for update ...')
+        if self.prereleases:
+            cmd.append('--prereleases')
 
-            run_in_background('__workflow_update_check', cmd)
+        self.logger.info('checking for update ...')
 
-        else:
-            self.logger.debug('update check not due')
+        run_in_background('__workflow_update_check', cmd)
 
     def start_update(self):
         """Check for update and download and install new workflow file.
@@ -2420,6 +2869,8 @@ class Workflow(object):
                                     account, '-w', password)
                 self.logger.debug('save_password : %s:%s', service, account)
 
+        self._mark_password(account, service)
+
     def get_password(self, account, service=None):
         """Retrieve the password saved at ``service/account``.
 
@@ -2438,8 +2889,12 @@ class Workflow(object):
         if not service:
             service = self.bundleid
 
-        output = self._call_security('find-generic-password', service,
-                                     account, '-g')
+        try:
+            output = self._call_security('find-generic-password', service,
+                                         account, '-g')
+        except PasswordNotFound:
+            self._mark_password(account, service, False)
+            raise
 
         # Parsing of `security` output is adapted from python-keyring
         # by Jason R. Coombs
@@ -2456,6 +2911,7 @@ class Workflow(object):
                 password = unicode(binascii.unhexlify(h), 'utf-8')
 
         self.logger.debug('got password : %s:%s', service, account)
+        self._mark_password(account, service)
 
         return password
 
@@ -2475,10 +2931,49 @@ class Workflow(object):
         if not service:
             service = self.bundleid
 
+        self._mark_password(account, service, False)
         self._call_security('delete-generic-password', service, account)
 
         self.logger.debug('deleted password : %s:%s', service, account)
 
+    def has_password(self, account, service=None):
+        """Whether a password is saved at ``service/account``.
+
+        Checks the marker files kept in sync by :meth:`save_password`,
+        :meth:`get_password` and :meth:`delete_password`, so it doesn't
+        have to call the ``security`` CLI program. Only if there is no
+        marker either way (e.g. the password was saved by an older
+        version of the workflow) is the Keychain queried, which records
+        the answer. A password added to the Keychain by other means
+        after that isn't noticed until it's read with
+        :meth:`get_password` or saved with :meth:`save_password`.
+
+        :param account: name of the account the password is for, e.g.
+            "Pinboard"
+        :type account: ``unicode``
+        :param service: Name of the service. By default, this is the workflow's
+                        bundle ID
+        :type service: ``unicode``
+        :returns: ``True`` if a password is saved, else ``False``
+        :rtype: ``Boolean``
+
+        """
+        if not service:
+            service = self.bundleid
+
+        if os.path.exists(self._password_marker(account, service)):
+            return True
+
+        if os.path.exists(self._password_marker(account, service, False)):
+            return False
+
+        try:
+            self.get_password(account, service)
+        except PasswordNotFound:
+            return False
+
+        return True
+
     ####################################################################
     # Methods for workflow:* magic args
     ####################################################################
@@ -2589,9 +3084,49 @@ class Workflow(object):
             if not isatty:
                 self.send_feedback()
 
+        # Background jobs
+        def show_jobstats():
+            """Display durations of recent background job runs in Alfred."""
+            from background import job_names, job_stats
+
+            isatty = sys.stderr.isatty()
+            shown = 0
+            for name in job_names():
+                stats = job_stats(name)
+                if stats is None:
+                    continue
+
+                shown += 1
+                title = '{0}: p50 {1:0.1f}s, p95 {2:0.1f}s'.format(
+                    name, stats['p50'], stats['p95'])
+                details = ['{0} run(s)'.format(stats['runs']),
+                           '{0} failed'.format(stats['failures']),
+                           '{0} timed out'.format(stats['timeouts'])]
+                for endpoint in sorted(stats['endpoints']):
+                    ttfb = stats['endpoints'][endpoint]
+                    details.append(
+                        '{0} TTFB p50 {1:0.2f}s, p95 {2:0.2f}s'.format(
+                            endpoint, ttfb['p50'], ttfb['p95']))
+
+                subtitle = ', '.join(details)
+                self.logger.info('%s (%s)', title, subtitle)
+                if not isatty:
+                    self.add_item(title, subtitle, valid=False,
+                                  icon=ICON_INFO)
+
+            if not isatty:
+                if not shown:
+                    self.add_item('No background jobs have run yet',
+                                  valid=False, icon=ICON_INFO)
+                self.send_feedback()
+
+            # The items are the result, so don't run the workflow
+            sys.exit(0)
+
         self.magic_arguments['help'] = do_help
         self.magic_arguments['magic'] = list_magic
         self.magic_arguments['version'] = show_version
+        self.magic_arguments['jobstats'] = show_jobstats
 
     def clear_cache(self, filter_func=lambda f: True):
         """Delete all files in workflow's :attr:`cachedir`.
@@ -2779,6 +3314,47 @@ class Workflow(object):
             os.makedirs(dirpath)
         return dirpath
 
+    def _password_marker(self, account, service, saved=True):
+        """Path of the file recording whether a password is saved.
+
+        :param account: name of the account the password is for
+        :type account: ``unicode``
+        :param service: Name of the service.
+        :type service: ``unicode``
+        :param saved: Return the path of the marker recording that the
+            password is saved (the default) or the one recording that
+            it isn't.
+        :type saved: ``Boolean``
+        :returns: path to marker file within workflow's data directory
+        :rtype: ``unicode``
+
+        """
+        suffix = 'password' if saved else 'nopassword'
+        return self.datafile('.{0}.{1}.alfred-workflow-{2}'.format(
+                             service, account, suffix))
+
+    def _mark_password(self, account, service, saved=True):
+        """Record whether password ``service/account`` is saved.
+
+        Creates the marker for ``saved`` and deletes the other one.
+
+        :param account: name of the account the password is for
+        :type account: ``unicode``
+        :param service: Name of the service.
+        :type service: ``unicode``
+        :param saved: Whether the password is saved in the Keychain.
+        :type saved: ``Boolean``
+
+        """
+        path = self._password_marker(account, service, saved)
+        other = self._password_marker(account, service, not saved)
+
+        if os.path.exists(other):
+            os.unlink(other)
+
+        if not os.path.exists(path):
+            open(path, 'wb').close()
+
     def _call_security(self, action, service, account, *args):
         """Call ``security`` CLI program that provides access to keychains.
 
@@ -614,7 +614,8 @@ class Workflow3(Workflow):
 
         return super(Workflow3, self).cache_data(name, data)
 
-    def cached_data(self, name, data_func=None, max_age=60, session=False):
+    def cached_data(self, name, data_func=None, max_age=60, revalidate=None,
+                    session=False):
         """Cache API with session-scoped expiry.
 
         .. versionadded:: 1.25
@@ -624,11 +625,13 @@ class Workflow3(Workflow):
             data_func (callable): Callable that returns fresh data. It
                 is called if the cache has expired or doesn't exist.
             max_age (int): Maximum allowable age of cache in seconds.
+            revalidate (list, optional): Command that regenerates the
+                cache in the background while stale data are returned.
             session (bool, optional): Whether to scope the cache
                 to the current session.
 
-        ``name``, ``data_func`` and ``max_age`` are the same as for the
-        :meth:`~workflow.Workflow.cached_data` method on
+        ``name``, ``data_func``, ``max_age`` and ``revalidate`` are the
+        same as for the :meth:`~workflow.Workflow.cached_data` method on
         :class:`~workflow.Workflow`.
 
         If ``session`` is ``True``, then ``name`` is prefixed
@@ -638,7 +641,27 @@ class Workflow3(Workflow):
         if session:
             name = self._mk_session_name(name)
 
-        return super(Workflow3, self).cached_data(name, data_func, max_age)
+        return super(Workflow3, self).cached_data(name, data_func, max_age,
+                                                  revalidate)
+
+    def cached_data_stale(self, name, session=False):
+        """Whether :meth:`cached_data` last returned stale data for `name`.
+
+        Args:
+            name (str): Cache key
+            session (bool, optional): Whether the cache is scoped
+                to the current session.
+
+        ``name`` is the same as for the
+        :meth:`~workflow.Workflow.cached_data_stale` method on
+        :class:`~workflow.Workflow`. Pass the same ``session`` as to
+        :meth:`cached_data`.
+
+        """
+        if session:
+            name = self._mk_session_name(name)
+
+        return super(Workflow3, self).cached_data_stale(name)
 
     def clear_session_cache(self, current=False):
         """Remove session data from the cache.
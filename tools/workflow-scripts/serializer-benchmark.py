@@ -0,0 +1,139 @@
+#!/usr/bin/python
+# encoding: utf-8
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+
+"""serializer-benchmark [options] [<records>...]
+
+Benchmark the serializers registered with `workflow.manager`.
+
+Dumps and loads a synthetic list of 10.000ft projects with every
+serializer and reports the best time of each and the size of the file.
+Use it to pick the `Workflow.cache_serializer`: `load` is what the
+Script Filter pays on every keystroke.
+
+Usage:
+    serializer-benchmark [-r <repeat>] [-s <name>]... [<records>...]
+    serializer-benchmark (-h|--help)
+
+Options:
+    -r, --repeat=<repeat>    Number of times to time each operation.
+                             The best time is reported [default: 5].
+    -s, --serializer=<name>  Only benchmark this serializer. May be given
+                             more than once. Default is all of them.
+    -h, --help               Show this message and exit.
+
+<records> are the sizes of the project lists to benchmark.
+Default is 1000, 10000 and 100000.
+
+"""
+
+from __future__ import print_function, unicode_literals
+
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from docopt import docopt
+
+# Import the workflow library from the workflow source
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'src'))
+
+from workflow import manager  # noqa: E402
+
+DEFAULT_RECORDS = (1000, 10000, 100000)
+
+STATES = ('Confirmed', 'Tentative', 'Internal')
+
+
+def make_projects(count):
+    """Return ``count`` projects shaped like the 10.000ft API's."""
+    projects = []
+    for i in xrange(count):
+        projects.append({
+            'id': i + 1,
+            'name': 'Project {0} caf\xe9'.format(i + 1),
+            'client': 'Client {0}'.format(i % 97),
+            'project_state': STATES[i % len(STATES)],
+            'project_code': 'PC{0}'.format(i + 1),
+            'starts_at': '2017-01-01',
+            'ends_at': '2017-12-31',
+            'archived': False,
+            'tags': {'data': [{'value': 'Tag{0}'.format(i % 5)},
+                              {'value': 'Team {0}'.format(i % 11)}]},
+        })
+
+    return projects
+
+
+def best_of(repeat, func):
+    """Return the fastest of ``repeat`` calls to ``func`` in seconds."""
+    times = []
+    for _ in xrange(repeat):
+        start = time.time()
+        func()
+        times.append(time.time() - start)
+
+    return min(times)
+
+
+def benchmark(name, projects, dirpath, repeat):
+    """Return ``(dump time, load time, file size)`` for serializer ``name``."""
+    serializer = manager.serializer(name)
+    path = os.path.join(dirpath, 'projects.' + name)
+
+    def dump():
+        with open(path, 'wb') as fp:
+            serializer.dump(projects, fp)
+
+    def load():
+        with open(path, 'rb') as fp:
+            return serializer.load(fp)
+
+    dump_time = best_of(repeat, dump)
+    load_time = best_of(repeat, load)
+
+    if load() != projects:
+        raise ValueError('{0} did not round-trip the data'.format(name))
+
+    return dump_time, load_time, os.path.getsize(path)
+
+
+def main(args=None):
+    """Run the benchmark and print a table of results."""
+    args = docopt(__doc__, argv=args)
+    repeat = int(args.get('--repeat'))
+    names = args.get('--serializer') or manager.serializers
+    sizes = [int(n) for n in args.get('<records>')] or DEFAULT_RECORDS
+
+    for name in names:
+        if manager.serializer(name) is None:
+            print('Unknown serializer: {0}'.format(name), file=sys.stderr)
+            return 1
+
+    dirpath = tempfile.mkdtemp()
+    try:
+        print('{0:>8}  {1:<14}{2:>10}{3:>10}{4:>12}'.format(
+              'records', 'serializer', 'dump ms', 'load ms', 'size KiB'))
+
+        for size in sizes:
+            projects = make_projects(size)
+            for name in names:
+                dump_time, load_time, filesize = benchmark(
+                    name, projects, dirpath, repeat)
+                print('{0:>8}  {1:<14}{2:>10.1f}{3:>10.1f}{4:>12.1f}'.format(
+                      size, name, dump_time * 1000, load_time * 1000,
+                      filesize / 1024.0))
+            print()
+    finally:
+        shutil.rmtree(dirpath)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+#!/usr/bin/python
+# encoding: utf-8
+#
+# MIT Licence. See http://opensource.org/licenses/MIT
+#
+
+"""transport-benchmark [options]
+
+Benchmark the HTTP backends of the workflow's `transport` module.
+
+Starts a stub HTTP/1.1 server on localhost that answers every request
+with a synthetic list of 10.000ft projects and times a series of GET
+requests with each backend. Reports the mean, median and 95th percentile
+of the request times, the median time to first byte, the number of
+connections the server saw and the bytes received per request.
+
+Usage:
+    transport-benchmark [-n <requests>] [-r <records>] [--no-gzip]
+                        [--fresh] [-b <backend>]...
+    transport-benchmark (-h|--help)
+
+Options:
+    -n, --requests=<requests>  Number of requests per backend [default: 50].
+    -r, --records=<records>    Number of projects in each response
+                               [default: 1000].
+    -b, --backend=<backend>    Only benchmark this backend. May be given
+                               more than once. Default is all of them.
+    --no-gzip                  Don't compress responses.
+    --fresh                    Use a new transport for every request, so
+                               connections aren't reused.
+    -h, --help                 Show this message and exit.
+
+"""
+
+from __future__ import print_function, unicode_literals
+
+import BaseHTTPServer
+import gzip
+import json
+import os
+import SocketServer
+import sys
+import threading
+from cStringIO import StringIO
+
+from docopt import docopt
+
+# Import the transport module from the workflow source
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..', 'src'))
+
+import transport  # noqa: E402
+
+BACKENDS = {
+    'pycurl': transport.CurlTransport,
+    'urllib2': transport.UrllibTransport,
+}
+
+STATES = ('Confirmed', 'Tentative', 'Internal')
+
+
+def make_body(count):
+    """Return a 10.000ft API response with ``count`` projects."""
+    projects = []
+    for i in xrange(count):
+        projects.append({
+            'id': i + 1,
+            'name': 'Project {0} caf\xe9'.format(i + 1),
+            'client': 'Client {0}'.format(i % 97),
+            'project_state': STATES[i % len(STATES)],
+            'project_code': 'PC{0}'.format(i + 1),
+            'tags': {'data': [{'value': 'Tag{0}'.format(i % 5)}]},
+        })
+
+    return json.dumps({'data': projects})
+
+
+def gzip_body(body):
+    """Return ``body`` gzipped."""
+    buf = StringIO()
+    with gzip.GzipFile(fileobj=buf, mode='wb') as fp:
+        fp.write(body)
+    return buf.getvalue()
+
+
+class StubServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """Answers every GET request with the same body."""
+
+    daemon_threads = True
+
+    def __init__(self, body, compress):
+        BaseHTTPServer.HTTPServer.__init__(self, ('127.0.0.1', 0),
+                                           StubHandler)
+        self.body = body
+        self.gzipped = gzip_body(body) if compress else None
+        self.clients = set()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{0}/api/v1/projects/'.format(
+            self.server_address[1])
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    # Don't let Nagle's algorithm hold back the end of a response until
+    # the client's delayed ACK, which would add ~40 ms to every request
+    # on a reused connection and hide the cost of the backends
+    disable_nagle_algorithm = True
+    wbufsize = -1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.clients.add(self.client_address)
+        body = self.server.body
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if (self.server.gzipped and
+                'gzip' in self.headers.get('accept-encoding', '')):
+            body = self.server.gzipped
+            self.send_header('Content-Encoding', 'gzip')
+
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def percentile(values, percent):
+    """Return the ``percent`` percentile of sorted ``values``."""
+    return values[int(round(percent / 100.0 * (len(values) - 1)))]
+
+
+def benchmark(cls, server, count, fresh):
+    """Return the responses to ``count`` requests made with ``cls``."""
+    responses = []
+    client = cls(retries=0)
+    try:
+        client.get(server.url)  # warm up
+        server.clients.clear()
+
+        for _ in xrange(count):
+            if fresh:
+                client.close()
+                client = cls(retries=0)
+
+            response = client.get(server.url, {'per_page': 10000})
+            response.raise_for_status()
+            responses.append(response)
+    finally:
+        client.close()
+
+    return responses
+
+
+def main(args=None):
+    """Run the benchmark and print a table of results."""
+    args = docopt(__doc__, argv=args)
+    count = int(args.get('--requests'))
+    names = args.get('--backend') or sorted(BACKENDS)
+
+    for name in names:
+        if name not in BACKENDS:
+            print('Unknown backend: {0}'.format(name), file=sys.stderr)
+            return 1
+
+    server = StubServer(make_body(int(args.get('--records'))),
+                        not args.get('--no-gzip'))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+
+    print('{0:<10}{1:>10}{2:>10}{3:>10}{4:>10}{5:>8}{6:>12}'.format(
+          'backend', 'mean ms', 'p50 ms', 'p95 ms', 'ttfb ms', 'conns',
+          'KiB/req'))
+
+    try:
+        for name in names:
+            try:
+                responses = benchmark(BACKENDS[name], server, count,
+                                      args.get('--fresh'))
+            except ImportError as err:
+                print('{0:<10}unavailable: {1}'.format(name, err))
+                continue
+
+            times = sorted(r.timing['total'] for r in responses)
+            ttfbs = sorted(r.timing['ttfb'] for r in responses)
+            print('{0:<10}{1:>10.2f}{2:>10.2f}{3:>10.2f}{4:>10.2f}{5:>8}'
+                  '{6:>12.1f}'.format(
+                      name, sum(times) / len(times) * 1000,
+                      percentile(times, 50) * 1000,
+                      percentile(times, 95) * 1000,
+                      percentile(ttfbs, 50) * 1000,
+                      len(server.clients),
+                      responses[-1].size / 1024.0))
+    finally:
+        server.shutdown()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())